@@ -0,0 +1,225 @@
+import re, sys, subprocess
+from collections import OrderedDict
+from stem_cache import stem as _stem
+
+# Same token pattern as nltk's RegexpTokenizer(r"[A-Za-z0-9]+(?:'[\w]+)?") used by every index so far
+TOKEN_PATTERN = r"[A-Za-z0-9]+(?:'[\w]+)?"
+# Shortest term kept by the default analyzer
+MIN_TERM_LENGTH = 2
+# Full-chain results memoized per raw token, the least recently used are evicted past this many tokens
+ANALYZER_CACHE_SIZE = 200000
+# Cold import time (seconds) that analyzer, naive_indexer and query_processor must stay under, see check_import_time()
+IMPORT_TIME_TARGET = 0.1
+
+# nltk's English stopword list (nltk_data/corpora/stopwords/english), embedded so that no corpus download
+# is needed at startup
+ENGLISH_STOPWORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself yourselves he him
+his himself she she's her hers herself it it's its itself they them their theirs themselves what which who
+whom this that that'll these those am is are was were be been being have has had having do does did doing
+a an the and but if or because as until while of at by for with about against between into through during
+before after above below to from up down in out on off over under again further then once here there when
+where why how all any both each few more most other some such no nor not only own same so than too very s
+t can will just don don't should should've now d ll m o re ve y ain aren aren't couldn couldn't didn
+didn't doesn doesn't hadn hadn't hasn hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't
+needn needn't shan shan't shouldn shouldn't wasn wasn't weren weren't won won't wouldn wouldn't
+""".split())
+
+
+# Drop-in replacement of nltk's RegexpTokenizer (gaps=False): tokens are the non-overlapping matches
+class RegexTokenizer:
+    def __init__(self, pattern=TOKEN_PATTERN):
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.UNICODE | re.MULTILINE | re.DOTALL)
+
+    def tokenize(self, text):
+        return self.regex.findall(text)
+
+TOKENIZER = RegexTokenizer()
+
+
+# =====================================
+# STAGES
+# =====================================
+# A stage maps one token to a token, or to None to drop it. Stages only look at the token itself,
+# so an analyzer can memoize its whole chain per raw token and keep token positions through the filters.
+# That memo is the analyzer's own cache: stem() is only reached on its misses, once per distinct token.
+
+# Removes all numbers (Table 5.1 row II)
+def remove_numbers(token):
+    return None if token.isdigit() else token
+
+# Converts tokens to their lowercase equivalent (Table 5.1 row III)
+def case_fold(token):
+    return token.lower()
+
+# Removes the given stopwords (Table 5.1 rows IV/V), nltk's English list by default
+def stop(stopwords=ENGLISH_STOPWORDS):
+    def stop(token):
+        return None if token in stopwords else token
+    return stop
+
+# Removes tokens shorter than n characters
+def min_length(n=MIN_TERM_LENGTH):
+    def min_length(token):
+        return token if len(token) >= n else None
+    return min_length
+
+# Porter stemming through the shared stem cache (Table 5.1 row VI), the stemmer is loaded on first use
+# Inside an analyzer it runs once per distinct token, the stem cache shares stems between analyzers
+def stem(token):
+    return _stem(token)
+
+
+# Tokenizer followed by a chain of stages
+# analyze / analyze_tokens / analyze_positions   final terms, memoized per raw token in a bounded LRU
+#                                                 cache (tokens are Zipfian, so almost every token is a hit)
+# analyze_stages                                  the output of every stage, each computed once from the
+#                                                 output of the previous one
+# normalize                                       the index term of a query term
+class Analyzer:
+    def __init__(self, stages, tokenizer=TOKENIZER, cache_size=ANALYZER_CACHE_SIZE):
+        self.stages = list(stages)
+        self.tokenizer = tokenizer
+        # cache_size=None disables eviction altogether
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # New analyzer running the stages of this one, then the given ones
+    def then(self, *stages):
+        return Analyzer(self.stages + list(stages), self.tokenizer, self.cache_size)
+
+    def stage_names(self):
+        return [stage.__name__ for stage in self.stages]
+
+    def tokenize(self, text):
+        return self.tokenizer.tokenize(text)
+
+    # Term of a single token, or None when a stage drops it
+    def term(self, token):
+        cache = self.cache
+        if token in cache:
+            self.hits += 1
+            cache.move_to_end(token)
+            return cache[token]
+        self.misses += 1
+        term = token
+        for stage in self.stages:
+            term = stage(term)
+            if term is None:
+                break
+        cache[token] = term
+        if self.cache_size is not None and len(cache) > self.cache_size:
+            cache.popitem(last=False)
+            self.evictions += 1
+        return term
+
+    # Same as term() on every token, with the cache hit inlined (it is almost every token)
+    def analyze_tokens(self, tokens):
+        cache = self.cache
+        terms = []
+        hits = 0
+        for token in tokens:
+            if token in cache:
+                hits += 1
+                cache.move_to_end(token)
+                term = cache[token]
+            else:
+                term = self.term(token)
+            if term is not None:
+                terms.append(term)
+        self.hits += hits
+        return terms
+
+    def analyze(self, text):
+        return self.analyze_tokens(self.tokenize(text))
+
+    # (term, position) pairs, positions count tokens before any filtering, so "bank of england" keeps its gap of 2
+    def analyze_positions(self, tokens):
+        terms = []
+        for position, token in enumerate(tokens):
+            term = self.term(token)
+            if term is not None:
+                terms.append((term, position))
+        return terms
+
+    # [(stage name, tokens after that stage)], starting with ('tokenize', tokens)
+    def analyze_stages(self, tokens):
+        outputs = [('tokenize', tokens)]
+        for stage in self.stages:
+            tokens = [token for token in map(stage, tokens) if token is not None]
+            outputs.append((stage.__name__, tokens))
+        return outputs
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    # Reports hits, misses, evictions and the hit rate since the last clear_cache()
+    def cache_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.cache),
+            'maxsize': self.cache_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    # Index term of a query term: the query goes through exactly the analyzer that built the index.
+    # A term the analyzer drops (eg: a stopword) becomes '', and one it splits into several terms
+    # (eg: "crude-oil") becomes their space-separated join; neither is ever an index term, so both match nothing
+    def normalize(self, term):
+        return ' '.join(self.analyze(term))
+
+
+# Analyzer of every index and every query of this project: case folding, stopwords, short tokens, stemming
+DEFAULT_ANALYZER = Analyzer([case_fold, stop(), min_length(), stem])
+
+
+# {term: postings} dict that remembers the analyzer that built it, for indexes built with any other chain
+# (eg: dictionary_compression.build_compressed_index): the lookups of query_processor normalize their
+# queries with it (see query_processor.index_analyzer)
+class AnalyzedIndex(dict):
+    def __init__(self, index=(), analyzer=DEFAULT_ANALYZER):
+        super().__init__(index)
+        self.analyzer = analyzer
+
+
+def print_stats(analyzer=None):
+    stats = (analyzer or DEFAULT_ANALYZER).cache_stats()
+    print(f"DEBUG: analyzer cache holds {stats['size']:,} tokens (bound {stats['maxsize']}), "
+          f"{stats['hits']:,} hits, {stats['misses']:,} misses, {stats['evictions']:,} evictions, "
+          f"hit rate {stats['hit_rate']:.1%}")
+
+
+# Imports every module in a fresh interpreter and returns its cold import time in seconds
+def measure_import_time(module):
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+# Fails if importing any of the modules takes longer than the target (best of a few runs, to skip disk cache misses)
+def check_import_time(modules=('analyzer', 'naive_indexer', 'query_processor'), target=IMPORT_TIME_TARGET, runs=3):
+    slow = []
+    for module in modules:
+        seconds = min(measure_import_time(module) for _ in range(runs))
+        print(f"DEBUG: import {module} took {seconds * 1000:.1f} ms (target {target * 1000:.0f} ms)")
+        if seconds > target:
+            slow.append(module)
+    if slow:
+        raise AssertionError(f"cold import over {target * 1000:.0f} ms: {', '.join(slow)}")
+
+# Testing
+if __name__ == "__main__":
+    sample = "The U.S. Federal Reserve's chairman said 1987 rates aren't rising, stocks rallied"
+    for name, tokens in DEFAULT_ANALYZER.analyze_stages(TOKENIZER.tokenize(sample)):
+        print(f"DEBUG: {name:15} {tokens}")
+    for query_term in ["Rallied", "the", "crude-oil"]:
+        print(f"DEBUG: query term {query_term!r} -> {DEFAULT_ANALYZER.normalize(query_term)!r}")
+    print_stats()
+    check_import_time()
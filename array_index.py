@@ -0,0 +1,101 @@
+#pip install numpy
+
+import time
+import numpy as np
+from query_processor import _normalize, index_analyzer, lookup_singleQ, lookup_andQ
+
+EMPTY = np.empty(0, dtype=np.uint32)
+
+# Default query set, the test queries used throughout the project
+DEFAULT_QUERIES = [
+    ("lawsuit",), ("bankruptcy",), ("hollywood",), ("copper",), ("chrysler",), ("bundesbank",),
+    ("liberal", "conservative"), ("supreme", "court"), ("cold", "war"), ("bundesbank", "chrysler"),
+]
+
+
+# Converts a {term: postings} index into {term: contiguous uint32 array}
+# Sortedness is checked once here, so queries never have to sort
+def build_array_index(index):
+    array_index = {}
+    for term, postings in index.items():
+        docids = np.fromiter(postings, dtype=np.uint32, count=len(postings))
+        if len(docids) > 1 and not np.all(docids[1:] > docids[:-1]):
+            raise ValueError(f"postings of {term!r} are not strictly increasing")
+        array_index[term] = docids
+    print(f"DEBUG: array index built with {len(array_index)} terms")
+    return array_index
+
+# Vectorized intersection of two sorted, duplicate-free arrays
+# Binary searches every docID of the shorter array in the longer one in a single searchsorted call
+def intersect_arrays(short, long):
+    if len(short) > len(long):
+        short, long = long, short
+    if not len(short):
+        return short
+    positions = np.searchsorted(long, short)
+    positions[positions == len(long)] = 0
+    return short[long[positions] == short]
+
+# Processes a single term query against an array index
+def lookup_singleQ_array(index, term):
+    start_time = time.perf_counter()
+    result = index.get(_normalize(term, index_analyzer(index)), EMPTY)
+    return result, time.perf_counter() - start_time
+
+# Multi-term AND against an array index: shortest arrays first, no Python-level loop over postings
+def lookup_andQ_array(index, *terms):
+    start_time = time.perf_counter()
+    analyzer = index_analyzer(index)
+    arrays = sorted((index.get(_normalize(t, analyzer), EMPTY) for t in terms), key=len)
+    if not arrays:
+        return EMPTY, time.perf_counter() - start_time
+    result = arrays[0]
+    for next_array in arrays[1:]:
+        if not len(result):
+            break
+        result = intersect_arrays(result, next_array)
+    return result, time.perf_counter() - start_time
+
+
+# Returns the p50 and p99 latencies (in microseconds) of running every query "repetitions" times
+def _latency_percentiles(run_query, queries, repetitions):
+    samples = []
+    for query in queries:
+        run_query(query)  # warmup
+        for _ in range(repetitions):
+            start = time.perf_counter_ns()
+            run_query(query)
+            samples.append(time.perf_counter_ns() - start)
+    p50, p99 = np.percentile(samples, [50, 99])
+    return p50 / 1000, p99 / 1000
+
+# Reports p50/p99 query latency of the array index against the current list-based implementation
+# and checks that both return the same documents
+def compare_latency(index, array_index, queries=DEFAULT_QUERIES, repetitions=1000):
+    def run_current(query):
+        if len(query) == 1:
+            return lookup_singleQ(index, query[0])[0]
+        return lookup_andQ(index, *query)[0]
+
+    def run_array(query):
+        if len(query) == 1:
+            return lookup_singleQ_array(array_index, query[0])[0]
+        return lookup_andQ_array(array_index, *query)[0]
+
+    for query in queries:
+        if list(run_current(query)) != run_array(query).tolist():
+            raise AssertionError(f"array index disagrees on {query!r}")
+
+    print("="*70)
+    print("QUERY LATENCY: SORTED LISTS VS NUMPY ARRAYS")
+    print("="*70)
+    for name, run_query in (("lists (query_processor)", run_current), ("numpy arrays", run_array)):
+        p50, p99 = _latency_percentiles(run_query, queries, repetitions)
+        print(f"{name:25} p50 {p50:10.2f}us   p99 {p99:10.2f}us")
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import inverted_index
+    # Both variants fully in memory, so only the query evaluation is compared
+    list_index = dict(inverted_index.items())
+    compare_latency(list_index, build_array_index(list_index))
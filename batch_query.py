@@ -0,0 +1,155 @@
+import os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from query_processor import _normalize, index_analyzer, choose_intersection
+
+# Default size of the worker pool evaluating a batch, one process per CPU (a single CPU evaluates serially)
+BATCH_WORKERS = os.cpu_count() or 1
+# Slices of the batch per worker: fewer slices share more fetches, more slices balance the load better
+CHUNKS_PER_WORKER = 2
+
+
+# Reads a query log, one query per line, terms separated by whitespace (implicit AND)
+def load_query_log(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.split() for line in f if line.strip()]
+
+# Evaluates one query against postings already fetched for the whole batch
+# Same semantics as lookup_singleQ/lookup_andQ: a single term or the AND of all terms
+def _evaluate(terms, postings):
+    lists = sorted((postings[term] for term in terms), key=len)
+    if not lists or not lists[0]:
+        return []
+    result = lists[0]
+    for next_postings in lists[1:]:
+        if not result:
+            break
+        result = choose_intersection(result, next_postings)(result, next_postings)
+    return list(result)
+
+def _percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+# Index opened by each process of a batch pool, once per process
+_worker_index = None
+
+def _open_worker_index(path):
+    global _worker_index
+    from index_store import open_index
+    _worker_index = open_index(path)
+
+# Evaluates a slice of the batch: every distinct term of the slice is fetched/decoded exactly once,
+# then each query is evaluated and timed. Returns (results, latencies in ns, distinct terms, postings, fetch ns)
+def _run_chunk(index, normalized):
+    fetch_start = time.perf_counter_ns()
+    unique_terms = sorted({term for terms in normalized for term in terms})
+    postings = {term: list(index.get(term, [])) for term in unique_terms}
+    fetch_ns = time.perf_counter_ns() - fetch_start
+    results, latencies = [], []
+    for terms in normalized:
+        start = time.perf_counter_ns()
+        results.append(_evaluate(terms, postings))
+        latencies.append(time.perf_counter_ns() - start)
+    return results, latencies, len(unique_terms), sum(len(p) for p in postings.values()), fetch_ns
+
+def _run_worker_chunk(normalized):
+    return _run_chunk(_worker_index, normalized)
+
+# Process pool for run_batch: every worker memory-maps the index file at path once, reusable across batches
+# of queries against that same file (the pool remembers its path and size, see run_batch)
+def open_batch_pool(path, workers=BATCH_WORKERS):
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_index, initargs=(path,))
+    pool.path, pool.workers = path, workers
+    return pool
+
+# Index terms of every query, each distinct raw term is normalized once for the whole batch
+def _normalize_batch(queries, analyzer):
+    terms_of = {}
+    normalized = []
+    for query in queries:
+        terms = set()
+        for raw in (query.split() if isinstance(query, str) else query):
+            if raw not in terms_of:
+                terms_of[raw] = _normalize(raw, analyzer)
+            terms.add(terms_of[raw])
+        normalized.append(tuple(terms))
+    return normalized
+
+
+# Runs a batch of queries (each a string or a sequence of terms) and returns (results, stats)
+# Every distinct raw term is normalized once, and its postings fetched/decoded once per slice of the batch.
+# Intersections are pure Python, so threads would all wait for the GIL: with workers > 1 the batch is
+# split into slices evaluated by a process pool whose workers open the index file (index_store) themselves.
+# An in-memory index (eg: a dict) cannot be shared with other processes and is evaluated serially.
+# pool: an open_batch_pool() to reuse, otherwise one is started (and its startup timed) for this batch.
+#       Its workers evaluate the batch against their own copy of the index, so index must be that same
+#       file (ValueError otherwise), and the pool's size replaces workers
+# The pool only pays off with several CPUs and large batches: every slice fetches its own postings and
+# the results are pickled back, so on one CPU it is slower than the serial evaluation
+def run_batch(index, queries, workers=BATCH_WORKERS, pool=None):
+    batch_start = time.perf_counter_ns()
+    normalized = _normalize_batch(queries, index_analyzer(index))
+
+    path = getattr(index, 'path', None)
+    if pool is not None:
+        if path is None or os.path.abspath(path) != os.path.abspath(pool.path):
+            raise ValueError(f"the batch pool serves {pool.path}, not the index {path}")
+        workers = pool.workers
+    if pool is None and (workers <= 1 or path is None):
+        workers = 1
+        chunks = [_run_chunk(index, normalized)]
+    else:
+        chunk_size = max(1, -(-len(normalized) // (workers * CHUNKS_PER_WORKER)))
+        slices = [normalized[i:i + chunk_size] for i in range(0, len(normalized), chunk_size)]
+        if pool is not None:
+            chunks = list(pool.map(_run_worker_chunk, slices))
+        else:
+            with open_batch_pool(path, workers) as batch_pool:
+                chunks = list(batch_pool.map(_run_worker_chunk, slices))
+    total_ns = time.perf_counter_ns() - batch_start
+
+    results = [result for chunk in chunks for result in chunk[0]]
+    latencies = sorted(latency for chunk in chunks for latency in chunk[1])
+    stats = {
+        'queries': len(queries),
+        'unique_terms': sum(chunk[2] for chunk in chunks),
+        'term_occurrences': sum(len(terms) for terms in normalized),
+        'postings_fetched': sum(chunk[3] for chunk in chunks),
+        'fetch_seconds': sum(chunk[4] for chunk in chunks) / 1e9,
+        'total_seconds': total_ns / 1e9,
+        'queries_per_second': len(queries) / (total_ns / 1e9) if total_ns else 0.0,
+        'latency_ns': latencies,
+        'p50_us': _percentile(latencies, 0.50) / 1000,
+        'p99_us': _percentile(latencies, 0.99) / 1000,
+        'workers': workers,
+    }
+    return results, stats
+
+def print_batch_stats(stats):
+    print("="*70)
+    print("BATCH QUERY EXECUTION")
+    print("="*70)
+    print(f"DEBUG: {stats['queries']:,} queries, {stats['term_occurrences']:,} term occurrences, "
+          f"{stats['unique_terms']:,} term fetches ({stats['postings_fetched']:,} postings)")
+    print(f"DEBUG: fetching took {stats['fetch_seconds']:.3f} seconds, the whole batch "
+          f"{stats['total_seconds']:.3f} seconds on {stats['workers']} workers")
+    print(f"DEBUG: throughput {stats['queries_per_second']:,.0f} queries/sec, "
+          f"per-query latency p50 {stats['p50_us']:.1f}us, p99 {stats['p99_us']:.1f}us")
+
+# Testing: replays a query log given on the command line, or the project's test queries
+if __name__ == "__main__":
+    from naive_indexer import inverted_index
+    if len(sys.argv) > 1:
+        queries = load_query_log(sys.argv[1])
+    else:
+        queries = [["lawsuit"], ["bankruptcy"], ["hollywood"], ["liberal", "conservative"],
+                   ["supreme", "court"], ["cold", "war"], ["copper"], ["Chrysler"], ["Bundesbank"],
+                   ["Bundesbank", "Chrysler"], ["pineapple"]] * 100
+    serial_results, serial_stats = run_batch(inverted_index, queries, workers=1)
+    print_batch_stats(serial_stats)
+    results, stats = run_batch(inverted_index, queries)
+    if results != serial_results:
+        raise AssertionError("the process pool disagrees with the serial evaluation")
+    print_batch_stats(stats)
@@ -0,0 +1,213 @@
+import re, time, heapq
+from query_processor import _normalize, index_analyzer
+from postings_codec import intersect_iter
+
+# ======================================
+# PARSER: AND / OR / NOT with parentheses
+# ======================================
+# query    := or_expr
+# or_expr  := and_expr ("OR" and_expr)*
+# and_expr := not_expr (["AND"] not_expr)*     adjacent operands are implicitly ANDed
+# not_expr := "NOT" not_expr | "(" or_expr ")" | term
+#
+# Operators must be written in upper case, so "and"/"or"/"not" in lower case remain ordinary terms.
+# Parse trees are nested tuples: ('term', t), ('and', [...]), ('or', [...]), ('not', child)
+
+QUERY_TOKEN = re.compile(r'\(|\)|[^\s()]+')
+OPERATORS = {'AND', 'OR', 'NOT'}
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+def parse_query(text):
+    tokens = QUERY_TOKEN.findall(text)
+    if not tokens:
+        raise QuerySyntaxError("empty query")
+    tree, pos = _parse_or(tokens, 0)
+    if pos != len(tokens):
+        raise QuerySyntaxError(f"unexpected {tokens[pos]!r} at position {pos}")
+    return tree
+
+def _parse_or(tokens, pos):
+    children = []
+    child, pos = _parse_and(tokens, pos)
+    children.append(child)
+    while pos < len(tokens) and tokens[pos] == 'OR':
+        child, pos = _parse_and(tokens, pos + 1)
+        children.append(child)
+    return (children[0] if len(children) == 1 else ('or', children)), pos
+
+def _parse_and(tokens, pos):
+    children = []
+    child, pos = _parse_not(tokens, pos)
+    children.append(child)
+    while pos < len(tokens) and tokens[pos] not in ('OR', ')'):
+        if tokens[pos] == 'AND':
+            pos += 1
+        child, pos = _parse_not(tokens, pos)
+        children.append(child)
+    return (children[0] if len(children) == 1 else ('and', children)), pos
+
+def _parse_not(tokens, pos):
+    if pos >= len(tokens):
+        raise QuerySyntaxError("unexpected end of query")
+    token = tokens[pos]
+    if token == 'NOT':
+        child, pos = _parse_not(tokens, pos + 1)
+        return ('not', child), pos
+    if token == '(':
+        child, pos = _parse_or(tokens, pos + 1)
+        if pos >= len(tokens) or tokens[pos] != ')':
+            raise QuerySyntaxError("missing closing parenthesis")
+        return child, pos + 1
+    if token in OPERATORS or token == ')':
+        raise QuerySyntaxError(f"unexpected {token!r} at position {pos}")
+    return ('term', token), pos + 1
+
+
+# ======================================
+# PLANNER
+# ======================================
+# Plans are nested tuples annotated with an estimated result size (the last element):
+#   ('term', t, df)
+#   ('and', [positive plans], [negated plans], estimate)   positive operands in ascending size order
+#   ('or', [plans], estimate)
+#   ('not', plan, inf)                                      complement, only for NOT outside any AND
+#   ('empty', 0)
+
+EMPTY_PLAN = ('empty', 0)
+
+# Document frequency of a normalized term, without decoding postings where the index allows it
+def _df(index, term):
+    if hasattr(index, 'document_frequency'):
+        return index.document_frequency(term)
+    return len(index.get(term, ()))
+
+def _estimate(plan):
+    return plan[-1]
+
+def plan_query(tree, index):
+    kind = tree[0]
+    if kind == 'term':
+        term = _normalize(tree[1], index_analyzer(index))
+        df = _df(index, term)
+        return ('term', term, df) if df else EMPTY_PLAN
+
+    if kind == 'not':
+        child = plan_query(tree[1], index)
+        if child[0] == 'not':
+            # NOT NOT x = x
+            return child[1]
+        # The size of a complement is unknown without the collection size, so it sorts last
+        return ('not', child, float('inf'))
+
+    children = [plan_query(child, index) for child in tree[1]]
+    if kind == 'or':
+        # Flattens nested ORs, drops empty operands
+        operands = []
+        for child in children:
+            if child[0] == 'or':
+                operands.extend(child[1])
+            elif child[0] != 'empty':
+                operands.append(child)
+        if not operands:
+            return EMPTY_PLAN
+        if len(operands) == 1:
+            return operands[0]
+        return ('or', operands, sum(_estimate(op) for op in operands))
+
+    # AND: flattens nested ANDs and rewrites NOT operands into AND-NOT merges
+    positives, negatives = [], []
+    for child in children:
+        if child[0] == 'and':
+            positives.extend(child[1])
+            negatives.extend(child[2])
+        elif child[0] == 'not':
+            negatives.append(child[1])
+        else:
+            positives.append(child)
+    # Short-circuits: any empty operand makes the whole conjunction empty
+    if any(child[0] == 'empty' for child in positives):
+        return EMPTY_PLAN
+    negatives = [child for child in negatives if child[0] != 'empty']
+    if not positives:
+        # Only negated operands: NOT (a OR b OR ...)
+        if not negatives:
+            # Every negated operand was empty: the complement is the whole collection
+            return ('not', EMPTY_PLAN, float('inf'))
+        excluded = ('or', negatives, sum(map(_estimate, negatives))) if len(negatives) > 1 else negatives[0]
+        return ('not', excluded, float('inf'))
+    # Orders operands by document frequency, smallest first
+    positives.sort(key=_estimate)
+    if not negatives and len(positives) == 1:
+        return positives[0]
+    return ('and', positives, negatives, _estimate(positives[0]))
+
+
+# ======================================
+# LAZY EVALUATION
+# ======================================
+
+# Union of sorted iterators without duplicates, nothing is materialized
+def union_iter(iterators):
+    previous = None
+    for docid in heapq.merge(*iterators):
+        if docid != previous:
+            yield docid
+            previous = docid
+
+# Documents of a sorted iterator that are not in another sorted iterator (AND-NOT merge)
+def difference_iter(p1, p2):
+    it2 = iter(p2)
+    excluded = next(it2, None)
+    for docid in p1:
+        while excluded is not None and excluded < docid:
+            excluded = next(it2, None)
+        if excluded != docid:
+            yield docid
+
+# Every docID of the collection, only needed for a NOT that is not part of an AND
+def collection_iter(index):
+    return union_iter(iter(postings) for _, postings in index.items())
+
+def evaluate(plan, index, universe=None):
+    kind = plan[0]
+    if kind == 'empty':
+        return iter(())
+    if kind == 'term':
+        return iter(index.get(plan[1], ()))
+    if kind == 'or':
+        return union_iter(evaluate(child, index, universe) for child in plan[1])
+    if kind == 'not':
+        everything = universe if universe is not None else collection_iter(index)
+        return difference_iter(everything, evaluate(plan[1], index, universe))
+    positives, negatives = plan[1], plan[2]
+    result = evaluate(positives[0], index, universe)
+    for child in positives[1:]:
+        result = intersect_iter(result, evaluate(child, index, universe))
+    for child in negatives:
+        result = difference_iter(result, evaluate(child, index, universe))
+    return result
+
+
+# Evaluates a Boolean query such as "(supreme OR federal) AND court AND NOT appeal"
+# limit: stops after the first "limit" documents, the rest of the operands are never read
+def lookup_booleanQ(index, query, limit=None, universe=None):
+    start_time = time.perf_counter()
+    plan = plan_query(parse_query(query), index)
+    result = []
+    for docid in evaluate(plan, index, universe):
+        result.append(docid)
+        if limit is not None and len(result) >= limit:
+            break
+    elapsed_time = time.perf_counter() - start_time
+    return result, elapsed_time
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import inverted_index
+    print("Searching up 'supreme AND court':", lookup_booleanQ(inverted_index, "supreme AND court"))
+    print("\nSearching up 'cold AND NOT war':", lookup_booleanQ(inverted_index, "cold AND NOT war"))
+    print("\nSearching up '(lawsuit OR bankruptcy) AND NOT hollywood':",
+          lookup_booleanQ(inverted_index, "(lawsuit OR bankruptcy) AND NOT hollywood"))
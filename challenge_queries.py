@@ -1,9 +1,10 @@
 from query_processor import lookup_singleQ, lookup_andQ
-from naive_indexer import inverted_index
+from naive_indexer import inverted_index, REUTERS_DIR
 from spimi_index import build_spimi_inspired
+from index_store import load_or_build
 
-reuters_dir = 'C:\\Users\\prowl\\Downloads\\reuters21578'  
-spimi_inverted_index, _, _ = build_spimi_inspired(reuters_dir)
+# Both indexes are persisted on first run and memory-mapped afterwards
+spimi_inverted_index = load_or_build('spimi_inverted_index.bin', lambda: build_spimi_inspired(REUTERS_DIR)[0])
 
 print("\nChallenge Query #1 'copper':", lookup_singleQ(inverted_index,"copper"))
 print("\nChallenge Query #2 'Chrysler':", lookup_singleQ(inverted_index,"Chrysler"))
@@ -13,4 +14,4 @@ print("\nChallenge Query Naive 'Bundesbank' and 'Chrysler':", lookup_andQ(invert
 print("\nChallenge Query Naive 'pineapple':", lookup_singleQ(inverted_index, "pineapple"))
 
 print("\nChallenge Query SPIMI 'Bundesbank' and 'Chrysler':", lookup_andQ(spimi_inverted_index, "Bundesbank", "Chrysler"))
-print("\nChallenge Query SPIMI 'pineapple':", lookup_singleQ(spimi_inverted_index, "pineapple"))
\ No newline at end of file
+print("\nChallenge Query SPIMI 'pineapple':", lookup_singleQ(spimi_inverted_index, "pineapple"))
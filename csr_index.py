@@ -0,0 +1,147 @@
+import sys, time
+from array import array
+
+# Bytes of a CPython object reference, one per element of a list
+POINTER_BYTES = 8
+
+
+# Immutable in-memory index in compressed sparse row (CSR) layout, with the lookup interface of a
+# {term: postings} dict (and of index_store.DiskIndex):
+#   docids        every postings list back to back, one uint32 docID per posting
+#   offsets       (terms + 1) uint64 start positions into docids, postings of term i are docids[offsets[i]:offsets[i+1]]
+#   term blob     every term in sorted order, UTF-8, concatenated
+#   term offsets  (terms + 1) uint32 start offsets into the term blob, in bytes
+# A dict of lists pays a pointer per posting, an int object per distinct docID and a list and a str object
+# per term; this layout pays 4 bytes per posting plus the term bytes and 12 bytes per term.
+# Terms are found by binary search over the blob (UTF-8 byte order is the same as str order)
+class CSRIndex:
+    def __init__(self, docids, offsets, term_blob, term_offsets):
+        self.docids = docids
+        self.offsets = offsets
+        self.term_blob = term_blob
+        self.term_offsets = term_offsets
+        self.num_terms = len(offsets) - 1
+
+    def term_at(self, i):
+        return self.term_blob[self.term_offsets[i]:self.term_offsets[i + 1]].decode('utf-8')
+
+    # Position of a term in the term table, -1 if it is not indexed
+    def find(self, term):
+        key = term.encode('utf-8')
+        blob, term_offsets = self.term_blob, self.term_offsets
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if blob[term_offsets[mid]:term_offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.num_terms and blob[term_offsets[lo]:term_offsets[lo + 1]] == key:
+            return lo
+        return -1
+
+    def postings_at(self, i):
+        return self.docids[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+    def document_frequency(self, term):
+        i = self.find(term)
+        return self.offsets[i + 1] - self.offsets[i] if i >= 0 else 0
+
+    def get(self, term, default=None):
+        i = self.find(term)
+        return self.postings_at(i) if i >= 0 else default
+
+    def __getitem__(self, term):
+        i = self.find(term)
+        if i < 0:
+            raise KeyError(term)
+        return self.postings_at(i)
+
+    def __contains__(self, term):
+        return self.find(term) >= 0
+
+    def __len__(self):
+        return self.num_terms
+
+    def __iter__(self):
+        return (self.term_at(i) for i in range(self.num_terms))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        return ((self.term_at(i), self.postings_at(i)) for i in range(self.num_terms))
+
+    # Bytes actually held by the index: the four arrays and the object itself
+    def nbytes(self):
+        return (sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self.docids)
+                + sys.getsizeof(self.offsets) + sys.getsizeof(self.term_blob) + sys.getsizeof(self.term_offsets))
+
+    # Compares the footprint of this index with the {term: postings} index it was built from
+    def memory_report(self, index):
+        csr_bytes = self.nbytes()
+        dict_bytes = dict_index_bytes(index)
+        num_postings = len(self.docids)
+        return {
+            'terms': self.num_terms,
+            'postings': num_postings,
+            'dict_bytes': dict_bytes,
+            'csr_bytes': csr_bytes,
+            'dict_bytes_per_posting': dict_bytes / num_postings if num_postings else 0.0,
+            'csr_bytes_per_posting': csr_bytes / num_postings if num_postings else 0.0,
+            'reduction': dict_bytes / csr_bytes if csr_bytes else 0.0,
+        }
+
+
+# Builds a CSRIndex in one pass over a {term: docID-sorted postings} index, eg: the output of
+# naive_indexer.build_inverted_index or spimi_index.build_spimi_inspired, or any index with items()
+def build_csr_index(index):
+    start_time = time.perf_counter()
+    docids = array('I')
+    offsets = array('Q', [0])
+    term_blob = bytearray()
+    term_offsets = array('I', [0])
+    for term, postings in sorted(index.items()):
+        docids.extend(postings)
+        offsets.append(len(docids))
+        term_blob += term.encode('utf-8')
+        term_offsets.append(len(term_blob))
+    csr_index = CSRIndex(docids, offsets, bytes(term_blob), term_offsets)
+    print(f"DEBUG: CSR index built with {len(csr_index):,} terms and {len(docids):,} postings "
+          f"in {time.perf_counter() - start_time:.2f} seconds")
+    return csr_index
+
+# Real byte footprint of a {term: list of docIDs} index: the dict, every term and list, and every distinct
+# int object (postings of the same document usually share one int object, so ints are counted once by identity)
+def dict_index_bytes(index):
+    total = sys.getsizeof(index)
+    seen_ints = set()
+    for term, postings in index.items():
+        total += sys.getsizeof(term) + sys.getsizeof(postings)
+        for docid in postings:
+            if id(docid) not in seen_ints:
+                seen_ints.add(id(docid))
+                total += sys.getsizeof(docid)
+    return total
+
+def print_memory_report(report):
+    print("="*70)
+    print("INDEX MEMORY: DICT OF LISTS VS CSR ARRAYS")
+    print("="*70)
+    print(f"DEBUG: {report['terms']:,} terms, {report['postings']:,} postings")
+    print(f"{'dict of lists':20} {report['dict_bytes']:15,} bytes {report['dict_bytes_per_posting']:8.2f} bytes/posting")
+    print(f"{'CSR arrays':20} {report['csr_bytes']:15,} bytes {report['csr_bytes_per_posting']:8.2f} bytes/posting")
+    print(f"DEBUG: CSR index is {report['reduction']:.1f}x smaller")
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import REUTERS_DIR, process_documents, sort_cull, build_inverted_index
+    from latency_benchmark import sample_queries, lookup_runner, run_benchmark, print_benchmark
+    list_index = build_inverted_index(sort_cull(process_documents(REUTERS_DIR)))
+    csr_index = build_csr_index(list_index)
+    if dict(csr_index.items()) != list_index:
+        raise AssertionError("CSR index differs from the index it was built from")
+    print_memory_report(csr_index.memory_report(list_index))
+    report = run_benchmark({'naive (dict)': lookup_runner(list_index), 'CSR arrays': lookup_runner(csr_index)},
+                           sample_queries(list_index), repetitions=50, reference='naive (dict)')
+    print_benchmark(report)
@@ -1,45 +1,20 @@
 import naive_indexer
-import nltk, os, glob, time
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import RegexpTokenizer
+import os, sys, glob, time
 from collections import Counter
-
-nltk.download('punkt', quiet=True)
-nltk.download('punkt-tab', quiet=True)
-nltk.download('stopwords', quiet=True)
-
-TOKENIZER = RegexpTokenizer(r"[A-Za-z0-9]+(?:'[\w]+)?")
-STOPWORDS = set(stopwords.words('english'))
-STEMMER = PorterStemmer()
+from postings_codec import CODECS, compress_index
+from lexicon import LexiconIndex, LEXICON_BLOCK_SIZE, hash_table_bytes
+from hyperloglog import HyperLogLog
+from token_cache import TokenCache, iter_tokenized
+from query_processor import lookup_singleQ
+import analyzer
 
 # =================================
 # PREPROCESSING FUNCTIONS FOR TABLE
 # =================================
 
-# Basic tokenization without any filtering whatsoever (row I)
-def tokenize_only(text):
-    return TOKENIZER.tokenize(text)
-
-# Removes all numbers from the token list (row II)
-def remove_numbers(tokens):
-    return [token for token in tokens if not token.isdigit()]
-
-# Converts all tokens to lowercase equivalent (row III)
-def case_fold(tokens):
-    return [token.lower() for token in tokens]
-
-# Removes all stopwords from the token list (row IV/V)
-def remove_stopwords(tokens, stopword_list):
-    return [token for token in tokens if token not in stopword_list]
-
-# Reduces tokens to their root or base form (row VI)
-def stem_tokens(tokens):
-    return [STEMMER.stem(token) for token in tokens]
-
-# Invoked during the cumulative preprocessing stages
-def chain_base(tokens):
-    return case_fold(remove_numbers(tokens))
+# Rows I-III of Table 5.1 with the shared analyzer stages (see analyzer.py): raw tokens, numbers removed,
+# case folded. Later rows add the corpus-specific stopword lists and stemming to this chain
+FOLDING = analyzer.Analyzer([analyzer.remove_numbers, analyzer.case_fold])
 
 # ===================================
 # HELPER FUNCTIONS FOR PRINTING TABLE
@@ -70,41 +45,34 @@ def calculate_total(current, baseline):
 
 # Builds Table 5.1 across all preprocessing stages
 # Each subsequent row is a cumulative reduction from the unfiltered set of tokens
-def build_compression_table(directory):
+# token_cache: reads the tokenized documents from a token_cache.TokenCache instead of parsing the SGML twice
+def build_compression_table(directory, token_cache=None):
     sgm_files = sorted(glob.glob(os.path.join(directory, '*sgm')))
     
     # First Pass: scans corpus to identify the 30/150 most common stopwords
     token_counts = Counter()
     for filepath in sgm_files:
-        documents = naive_indexer.parse_sgm(filepath)
-        for _, text in documents:
-            tokens = tokenize_only(text)
-            lctokens = case_fold(remove_numbers(tokens))
-            token_counts.update(lctokens)
+        for _, tokens in iter_tokenized(filepath, token_cache):
+            token_counts.update(FOLDING.analyze_tokens(tokens))
     
     # Generates custom stopword lists
     top_30_stops = {word for word, _ in token_counts.most_common(30)}
     top_150_stops = {word for word, _ in token_counts.most_common(150)}
     
-    # Defines the preprocessing stages (ie: the rows of the table)
-    preprocessing_stages = {
-        'unfiltered': lambda t: t,
-        'no_numbers': remove_numbers,
-        'case_folding': chain_base,
-        'stop_30': lambda t: remove_stopwords(chain_base(t), top_30_stops),
-        'stop_150': lambda t: remove_stopwords(chain_base(t), top_150_stops),
-        'stemming': lambda t: stem_tokens(remove_stopwords(chain_base(t), top_150_stops))
-    }
-    
+    # Defines the preprocessing stages (ie: the rows of the table) as one analyzer chain, so every row is
+    # computed from the previous one instead of from scratch; the 30 stopword row branches off case folding
+    table_analyzer = FOLDING.then(analyzer.stop(top_150_stops), analyzer.stem)
+    stop_30 = analyzer.Analyzer([analyzer.stop(top_30_stops)])
+    chain_rows = ['unfiltered', 'no_numbers', 'case_folding', 'stop_150', 'stemming']
+
     # Second Pass: re-scans corpus to apply filters and count savings
     # stages_F: dictionary storing refined (term,docID) pairs for each preprocessing stage
-    stages_F = {stage: [] for stage in preprocessing_stages}
+    stages_F = {stage: [] for stage in chain_rows + ['stop_30']}
     for filepath in sgm_files:
-        documents = naive_indexer.parse_sgm(filepath)
-        for docID, text in documents:
-            tokens = tokenize_only(text)
-            for stage_name, preprocess_func in preprocessing_stages.items():
-                terms = preprocess_func(tokens)
+        for docID, tokens in iter_tokenized(filepath, token_cache):
+            outputs = dict(zip(chain_rows, (terms for _, terms in table_analyzer.analyze_stages(tokens))))
+            outputs['stop_30'] = stop_30.analyze_tokens(outputs['case_folding'])
+            for stage_name, terms in outputs.items():
                 stages_F[stage_name].extend((term, docID) for term in terms)
 
     # results: aggregates raw data from "stages_F" into counts for future analysis
@@ -121,6 +89,74 @@ def build_compression_table(directory):
         }
     return results
 
+# Single-pass, low-memory version of build_compression_table with the same Table 5.1 numbers
+# Every document is tokenized and case folded once, and only per-term statistics are kept:
+#   postings of rows I-III     sums of the distinct (number-free, case folded) tokens of every document
+#   rows IV/V                  the top 30/150 stopwords are known at the end from the token counts,
+#                              their document frequencies are subtracted from the case folding row
+#   row VI (stemming)          sum of the df of the remaining terms, minus one posting per extra surface form
+#                              of a stem within a document, counted through the groups of terms sharing a stem
+# Peak memory grows with the vocabulary, not with the number of tokens.
+# approximate: the distinct term counts of rows I, II and VI come from HyperLogLog sketches instead of sets
+def build_compression_table_streaming(directory, approximate=False, token_cache=None):
+    sgm_files = sorted(glob.glob(os.path.join(directory, '*sgm')))
+    raw_terms = HyperLogLog() if approximate else set()
+    word_terms = HyperLogLog() if approximate else set()
+    postings = Counter()
+    folded_counts = Counter()
+    folded_df = Counter()
+    # frozenset of case folded terms sharing a stem within a document -> number of such documents
+    stem_groups = Counter()
+
+    for filepath in sgm_files:
+        for _, tokens in iter_tokenized(filepath, token_cache):
+            distinct = set(tokens)
+            words = {token for token in distinct if analyzer.remove_numbers(token) is not None}
+            folded_tokens = FOLDING.analyze_tokens(tokens)
+            folded = set(folded_tokens)
+            raw_terms.update(distinct)
+            word_terms.update(words)
+            folded_counts.update(folded_tokens)
+            folded_df.update(folded)
+            postings['unfiltered'] += len(distinct)
+            postings['no_numbers'] += len(words)
+            postings['case_folding'] += len(folded)
+
+            by_stem = {}
+            for term in folded:
+                by_stem.setdefault(analyzer.stem(term), []).append(term)
+            for group in by_stem.values():
+                if len(group) > 1:
+                    stem_groups[frozenset(group)] += 1
+
+    results = {
+        'unfiltered': {'terms': len(raw_terms), 'postings': postings['unfiltered']},
+        'no_numbers': {'terms': len(word_terms), 'postings': postings['no_numbers']},
+        'case_folding': {'terms': len(folded_df), 'postings': postings['case_folding']},
+    }
+    stopword_lists = {'stop_30': {word for word, _ in folded_counts.most_common(30)},
+                      'stop_150': {word for word, _ in folded_counts.most_common(150)}}
+    for stage_name, stops in stopword_lists.items():
+        results[stage_name] = {
+            'terms': len(folded_df) - len(stops),
+            'postings': postings['case_folding'] - sum(folded_df[word] for word in stops),
+        }
+
+    # Row VI stems what is left after the 150 stopwords
+    stops = stopword_lists['stop_150']
+    stems = HyperLogLog() if approximate else set()
+    stem_postings = 0
+    for term, df in folded_df.items():
+        if term not in stops:
+            stems.add(analyzer.stem(term))
+            stem_postings += df
+    for group, docs in stem_groups.items():
+        surviving = len(group - stops)
+        if surviving > 1:
+            stem_postings -= docs * (surviving - 1)
+    results['stemming'] = {'terms': len(stems), 'postings': stem_postings}
+    return results
+
 # Prints the final compression table to the console
 # Evaluates Δ% and T% respectively during construction
 def print_table(results):
@@ -165,69 +201,149 @@ def print_table(results):
 
     print("="*80)
 
+# Extends the Table 5.1 analysis with the memory footprint of the dictionary itself (Table 5.2)
+# Compares the hash table layout used by every index in this project with the dictionary-as-a-string layouts
+def build_lexicon_table(index, block_size=LEXICON_BLOCK_SIZE):
+    layouts = {
+        'hash table': None,
+        'dictionary as a string': LexiconIndex(index, block_size=1, front_coding=False),
+        f'blocking, k={block_size}': LexiconIndex(index, block_size=block_size, front_coding=False),
+        'blocking & front coding': LexiconIndex(index, block_size=block_size, front_coding=True),
+    }
+    results = {}
+    for layout_name, lexicon_index in layouts.items():
+        if lexicon_index is None:
+            size = hash_table_bytes(index)
+        else:
+            size = lexicon_index.dictionary_bytes()
+        results[layout_name] = {'bytes': size, 'bytes_per_term': size / len(index) if index else 0}
+    return results
+
+# Prints the dictionary memory table to the console
+def print_lexicon_table(results):
+    baseline = results['hash table']['bytes']
+    print("\n"+"="*80)
+    print("Dictionary Memory (5.2)")
+    print("="*80)
+    print(f"{'data structure':30} {'size in bytes':>15} {'bytes/term':>12} {'T%':>6}")
+    print("-"*80)
+    for layout_name, row in results.items():
+        print(f"{layout_name:30} {row['bytes']:15,} {row['bytes_per_term']:12.1f} "
+              f"{calculate_total(row['bytes'], baseline):>6}")
+    print("="*80)
+
 # Constructs the inverted index with all compression techniques applied
-def build_compressed_index(directory, stop_k: int = 150):
+# The index is an analyzer.AnalyzedIndex carrying its own analyzer (corpus stopwords, no minimum length),
+# so the lookups of query_processor normalize queries the way this index was built
+# codec: optionally also gap-encodes the postings ('vbyte', 'gamma' or 'delta', see postings_codec.py)
+# token_cache: reads the tokenized documents from a token_cache.TokenCache instead of parsing the SGML twice
+def build_compressed_index(directory, stop_k: int = 150, codec=None, token_cache=None):
     sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
 
     # First Pass: scans corpus to identify the "k" most common stopwords
     token_counts = Counter()
     for filepath in sgm_files:
-        for docID, text in naive_indexer.parse_sgm(filepath):
-            tokens = tokenize_only(text)
-            normalized = chain_base(tokens)
-            token_counts.update(normalized)
+        for docID, tokens in iter_tokenized(filepath, token_cache):
+            token_counts.update(FOLDING.analyze_tokens(tokens))
     top_k_stopwords = {word for word, _ in token_counts.most_common(stop_k)}
 
     # Second Pass: generates (term, docID) pairs after applying all compression techniques
+    compressing = FOLDING.then(analyzer.stop(top_k_stopwords), analyzer.stem)
     F = []
     for filepath in sgm_files:
-        for docID, text in naive_indexer.parse_sgm(filepath):
-            tokens = tokenize_only(text)
-            normalized = chain_base(tokens)
-            filtered = remove_stopwords(normalized, top_k_stopwords)
-            stemmed = stem_tokens(filtered)
-            for term in stemmed:
-                F.append((term, docID))
+        for docID, tokens in iter_tokenized(filepath, token_cache):
+            F.extend((term, docID) for term in compressing.analyze_tokens(tokens))
     
     # Proceed with constructing the finalized compressed index
     F_sorted = naive_indexer.sort_cull(F)
-    compressed_index = naive_indexer.build_inverted_index(F_sorted)
+    compressed_index = analyzer.AnalyzedIndex(naive_indexer.build_inverted_index(F_sorted), compressing)
+    if codec:
+        compressed_index = compress_index(compressed_index, codec)
     print("DEBUG: the compressed inverted index has been successfully constructed.")
     return compressed_index        
 
-from naive_indexer import inverted_index
-from query_processor import lookup_singleQ, lookup_andQ
+# Looks up every term of a build_compressed_index() index through query_processor.lookup_singleQ and checks
+# that each returns the term's postings. Porter stemming is not idempotent (a stem may stem further), so every
+# term is queried with a corpus word that analyzes to it rather than with the term itself
+def check_compressed_lookups(directory, compressed_index, token_cache=None):
+    compressing = compressed_index.analyzer
+    word_of = {}
+    for filepath in sorted(glob.glob(os.path.join(directory, '*.sgm'))):
+        for docID, tokens in iter_tokenized(filepath, token_cache):
+            for token in tokens:
+                term = compressing.term(token)
+                if term is not None and term not in word_of:
+                    word_of[term] = token
+    for term, postings in compressed_index.items():
+        result, _ = lookup_singleQ(compressed_index, word_of[term])
+        if result != list(postings):
+            raise AssertionError(f"lookup of {word_of[term]!r} does not return the postings of {term!r}")
+    print(f"DEBUG: every one of the {len(compressed_index):,} compressed index terms found by lookup_singleQ")
+
+# ===================================
+# POSTINGS COMPRESSION REPORT
+# ===================================
+
+# Measures every codec on the postings of an uncompressed {term: [docIDs]} index
+# Reports total bytes, bytes and bits per posting, and decode throughput (postings/sec)
+def build_postings_report(index, codecs=tuple(CODECS)):
+    num_postings = sum(len(postings) for postings in index.values())
+    results = {
+        # Python list of int references (8-byte pointers + list header), ints shared per docID
+        'python list': {'bytes': sum(sys.getsizeof(postings) for postings in index.values()), 'decode': None},
+        # Fixed-width 32-bit docIDs, as stored by index_store
+        'uint32': {'bytes': 4 * num_postings, 'decode': None},
+    }
+    for codec in codecs:
+        compressed = compress_index(index, codec)
+        start_time = time.perf_counter()
+        for postings in compressed.values():
+            for _ in postings:
+                pass
+        decode_time = time.perf_counter() - start_time
+        results[codec] = {
+            'bytes': sum(len(postings.data) for postings in compressed.values()),
+            'decode': num_postings / decode_time if decode_time else None,
+        }
+    for row in results.values():
+        row['bytes_per_posting'] = row['bytes'] / num_postings if num_postings else 0
+    return results
+
+# Prints the postings compression report to the console
+def print_postings_report(results):
+    baseline = results['uint32']['bytes']
+    print("\n"+"="*80)
+    print("Postings Compression")
+    print("="*80)
+    print(f"{'codec':15} {'bytes':>14} {'bytes/posting':>14} {'bits/posting':>13} {'vs uint32':>10} {'decode/sec':>12}")
+    print("-"*80)
+    for codec, row in results.items():
+        decode = f"{row['decode']:12,.0f}" if row['decode'] else f"{'-':>12}"
+        print(f"{codec:15} {row['bytes']:14,} {row['bytes_per_posting']:14.2f} "
+              f"{8 * row['bytes_per_posting']:13.2f} {row['bytes'] / baseline:10.1%} {decode}")
+    print("="*80)
+
 if __name__ == "__main__":
+    from naive_indexer import inverted_index
+    from latency_benchmark import sample_queries, lookup_runner, run_benchmark, print_benchmark, write_benchmark
+
     # Testing
     reuters_dir = 'C:\\Users\\prowl\\Downloads\\reuters21578'   
-    compressed_index = build_compressed_index(reuters_dir)
-    #results = build_compression_table(reuters_dir)
+    token_cache = TokenCache()
+    compressed_index = build_compressed_index(reuters_dir, token_cache=token_cache)
+    check_compressed_lookups(reuters_dir, compressed_index, token_cache)
+    print_postings_report(build_postings_report(compressed_index))
+    print_lexicon_table(build_lexicon_table(compressed_index))
+    #results = build_compression_table_streaming(reuters_dir, token_cache=token_cache)
     #print_table(results)
 
-    # Single Term test queries with Naive Indexer
-    answern1, naive_time_s1 = lookup_singleQ(inverted_index,"lawsuit")
-    answern2, naive_time_s2 = lookup_singleQ(inverted_index,"bankruptcy")
-    answern3, naive_time_s3 = lookup_singleQ(inverted_index,"hollywood")
-    
-    # Multiple Term test queries with Naive Indexer
-    answern4, naive_time_a1 = lookup_andQ(inverted_index, "liberal", "conservative")
-    answern5, naive_time_a2 = lookup_andQ(inverted_index, "supreme", "court")
-    answern6, naive_time_a3 = lookup_andQ(inverted_index, "cold", "war")
-
-    # Single Term test queries with Compressed Indexer
-    answerc1, compress_time_s1 = lookup_singleQ(compressed_index,"lawsuit")
-    answerc2, compress_time_s2 = lookup_singleQ(compressed_index,"bankruptcy")
-    answerc3, compress_time_s3 = lookup_singleQ(compressed_index,"hollywood")
-    
-    # Multiple Term test queries with Compressed Indexer
-    answerc4, compress_time_a1 = lookup_andQ(compressed_index, "liberal", "conservative")
-    answerc5, compress_time_a2 = lookup_andQ(compressed_index, "supreme", "court")
-    answerc6, compress_time_a3 = lookup_andQ(compressed_index, "cold", "war")
-
-    # Comparison of Runtimes
-    print(f"\nFor 'lawsuit': naive took {naive_time_s1} seconds, compressed index took {compress_time_s1} seconds.")
-    print(f"For 'bankruptcy': naive took {naive_time_s2} seconds, compressed index took {compress_time_s2} seconds.")
-    print(f"For 'hollywood': naive took {naive_time_s3} seconds, compressed index took {compress_time_s3} seconds.")
-    print(f"For 'liberal' and 'conservative': naive took {naive_time_a1} seconds, compressed index took {compress_time_a1} seconds.")
-    print(f"For 'supreme' and 'court': naive took {naive_time_a2} seconds, compressed index took {compress_time_a2} seconds.")
-    print(f"For 'cold' and 'war': naive took {naive_time_a3} seconds, compressed index took {compress_time_a3} seconds.")
\ No newline at end of file
+    # Query latency on df-banded query sets (see latency_benchmark.py), sampled from the index under test:
+    # the compressed index has its own vocabulary (150 stopwords, every term stemmed), and its vbyte
+    # variant is checked against it as the uncompressed reference. The naive index gets its own query sets.
+    naive_report = run_benchmark({'naive': lookup_runner(inverted_index)}, sample_queries(inverted_index))
+    print_benchmark(naive_report)
+    report = run_benchmark({'compressed': lookup_runner(compressed_index),
+                            'compressed (vbyte)': lookup_runner(compress_index(compressed_index, 'vbyte'))},
+                           sample_queries(compressed_index), reference='compressed')
+    print_benchmark(report)
+    write_benchmark(report, 'dictionary_compression_latency.json')
@@ -0,0 +1,279 @@
+import os, glob, json, heapq, threading, time
+from bisect import bisect_left
+from naive_indexer import parse_sgm, preprocess_tokenize, preprocess_tokens
+from index_store import IndexWriter, open_index
+
+# Postings held by the in-memory auxiliary index before it is flushed to disk
+AUX_POSTINGS_LIMIT = 100000
+STATE_FILE = 'state.json'
+TOMBSTONE_FILE = 'tombstones.bin'
+DOCUMENTS_FILE = 'documents.bin'
+
+
+def _get_bit(bitmap, n):
+    byte = n >> 3
+    return byte < len(bitmap) and bool(bitmap[byte] & (1 << (n & 7)))
+
+def _set_bit(bitmap, n):
+    byte = n >> 3
+    if byte >= len(bitmap):
+        bitmap.extend(bytes(byte + 1 - len(bitmap)))
+    bitmap[byte] |= 1 << (n & 7)
+
+
+# Merges several sources of (term, docID-sorted postings) pairs, each in term order, into one such stream
+# Postings of the same term are merged by docID, deleted docIDs are dropped
+def _merge_sources(sources, is_deleted):
+    streams = [((term, n, postings) for term, postings in source) for n, source in enumerate(sources)]
+    current_term = None
+    current = []
+    for term, _, postings in heapq.merge(*streams):
+        if term != current_term:
+            if current:
+                yield current_term, current
+            current_term = term
+            current = []
+        current = [docid for docid in heapq.merge(current, postings) if not is_deleted(docid)]
+    if current:
+        yield current_term, current
+
+
+# Updatable index (Section 4.5): new documents go into an in-memory auxiliary index, which is flushed
+# into on-disk generations I_0, I_1, ... of 2^i * aux_limit postings merged logarithmically (Figure 4.7),
+# so every posting is rewritten at most log(T / aux_limit) times instead of rebuilding the whole index.
+# Deleted documents are recorded in a tombstone bitmap and filtered out of every lookup;
+# their postings are physically dropped the next time the generation holding them is merged.
+# A second bitmap records the docIDs of every flushed document, and a set those of the auxiliary index,
+# so a document cannot be added twice; only the bitmap is persisted, in step with the generations.
+#
+# get() returns the merged, docID-sorted postings of all generations, so the index works with
+# lookup_singleQ/lookup_andQ, and "generation" changes on every update (see query_cache.index_generation).
+# Updates and lookups are serialized by a lock, so a lookup never sees a half-finished merge.
+# items()/keys() stream a k-way merge of all generations, and len() counts it once per generation:
+# both cost a pass over the whole index, so use get() for lookups.
+# The auxiliary index only lives in memory: call flush() or close() to persist it.
+class DynamicIndex:
+    def __init__(self, directory, aux_limit=AUX_POSTINGS_LIMIT):
+        self.directory = directory
+        self.aux_limit = aux_limit
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.RLock()
+        self.aux = {}
+        self.aux_postings = 0
+        # docIDs added since the last flush, moved into the documents bitmap by flush()
+        self.aux_documents = set()
+        # level -> DiskIndex of that generation
+        self.levels = {}
+        self.generation = 0
+        self.postings_written = 0
+        self.postings_added = 0
+        self.merges = 0
+        # (generation, number of terms) of the last len()
+        self._term_count = None
+
+        state_path = os.path.join(directory, STATE_FILE)
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.generation = state['generation']
+            for level, filename in state['levels'].items():
+                self.levels[int(level)] = open_index(os.path.join(directory, filename))
+        tombstone_path = os.path.join(directory, TOMBSTONE_FILE)
+        if os.path.exists(tombstone_path):
+            with open(tombstone_path, 'rb') as f:
+                self.tombstones = bytearray(f.read())
+        else:
+            self.tombstones = bytearray()
+        documents_path = os.path.join(directory, DOCUMENTS_FILE)
+        if os.path.exists(documents_path):
+            with open(documents_path, 'rb') as f:
+                self.documents = bytearray(f.read())
+        else:
+            self.documents = bytearray()
+
+    def _save_state(self):
+        state = {'generation': self.generation,
+                 'levels': {level: os.path.basename(index.path) for level, index in self.levels.items()}}
+        state_path = os.path.join(self.directory, STATE_FILE)
+        with open(state_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(state_path + '.tmp', state_path)
+        tombstone_path = os.path.join(self.directory, TOMBSTONE_FILE)
+        with open(tombstone_path + '.tmp', 'wb') as f:
+            f.write(self.tombstones)
+        os.replace(tombstone_path + '.tmp', tombstone_path)
+        documents_path = os.path.join(self.directory, DOCUMENTS_FILE)
+        with open(documents_path + '.tmp', 'wb') as f:
+            f.write(self.documents)
+        os.replace(documents_path + '.tmp', documents_path)
+
+    def is_deleted(self, docid):
+        return _get_bit(self.tombstones, docid)
+
+    # Adds one document from its preprocessed terms, docIDs are never reused (not even after a delete)
+    def add_document(self, docid, terms):
+        with self.lock:
+            if self.is_deleted(docid):
+                raise ValueError(f"docID {docid} was deleted and cannot be reused")
+            if docid in self.aux_documents or _get_bit(self.documents, docid):
+                raise ValueError(f"docID {docid} is already indexed")
+            self.aux_documents.add(docid)
+            for term in set(terms):
+                postings = self.aux.setdefault(term, [])
+                if not postings or postings[-1] < docid:
+                    postings.append(docid)
+                else:
+                    # Documents normally arrive in docID order, this only handles the exceptions
+                    postings.insert(bisect_left(postings, docid), docid)
+                self.aux_postings += 1
+                self.postings_added += 1
+            self.generation += 1
+            if self.aux_postings >= self.aux_limit:
+                self.flush()
+
+    # Indexes every document of an .sgm file, optionally through a token_cache.TokenCache
+    def add_file(self, filepath, token_cache=None):
+        if token_cache is not None:
+            documents = ((docid, preprocess_tokens(tokens)) for docid, tokens in token_cache.iter_file(filepath))
+        else:
+            documents = ((docid, preprocess_tokenize(text)) for docid, text in parse_sgm(filepath))
+        num_docs = 0
+        for docid, terms in documents:
+            self.add_document(docid, terms)
+            num_docs += 1
+        return num_docs
+
+    # Marks a document as deleted, it disappears from every lookup immediately
+    def delete(self, docid):
+        with self.lock:
+            _set_bit(self.tombstones, docid)
+            self.generation += 1
+            self._save_state()
+
+    # Writes the auxiliary index out as I_0, or merges it with I_0 ... I_(j-1) into I_j when those exist
+    # The textbook merges pairwise level by level; merging all occupied levels in a single k-way pass
+    # produces the same I_j while writing each posting once
+    def flush(self):
+        with self.lock:
+            if not self.aux:
+                # Only documents without any term: nothing to write, but their docIDs are taken
+                if self.aux_documents:
+                    self._flush_documents()
+                    self._save_state()
+                return
+            target = 0
+            while target in self.levels:
+                target += 1
+            merged_levels = [self.levels[level] for level in range(target)]
+            sources = [sorted(self.aux.items())] + [index.items() for index in merged_levels]
+            path = os.path.join(self.directory, f'level_{target}_{self.generation}.bin')
+            with IndexWriter(path) as writer:
+                for term, postings in _merge_sources(sources, self.is_deleted):
+                    writer.add(term, postings)
+                    self.postings_written += len(postings)
+            # Switch to the new generation first, then drop the merged ones
+            self.levels[target] = open_index(path)
+            for level in range(target):
+                del self.levels[level]
+            self.aux = {}
+            self.aux_postings = 0
+            self._flush_documents()
+            self.generation += 1
+            self.merges += 1
+            self._save_state()
+            for index in merged_levels:
+                index.close()
+                os.remove(index.path)
+            print(f"DEBUG: flushed into level {target} ({len(self.levels[target]):,} terms), "
+                  f"levels now {sorted(self.levels)}")
+
+    def _flush_documents(self):
+        for docid in self.aux_documents:
+            _set_bit(self.documents, docid)
+        self.aux_documents = set()
+
+    # Postings of a term across the auxiliary index and every generation, deleted documents removed
+    def get(self, term, default=None):
+        with self.lock:
+            lists = [index.get(term, []) for index in self.levels.values()]
+            lists.append(self.aux.get(term, []))
+            postings = [docid for docid in heapq.merge(*lists) if not self.is_deleted(docid)]
+        return postings if postings else default
+
+    def __getitem__(self, term):
+        postings = self.get(term)
+        if postings is None:
+            raise KeyError(term)
+        return postings
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def document_frequency(self, term):
+        return len(self.get(term, []))
+
+    # Streams (term, postings) pairs in term order, deleted documents removed, without materializing the index
+    # The lock is held until the iteration ends, and, as with a dict, updating the index during the
+    # iteration raises RuntimeError
+    def items(self):
+        with self.lock:
+            generation = self.generation
+            sources = [sorted(self.aux.items())] + [index.items() for index in self.levels.values()]
+            for item in _merge_sources(sources, self.is_deleted):
+                yield item
+                if self.generation != generation:
+                    raise RuntimeError("DynamicIndex changed during iteration")
+
+    def keys(self):
+        return (term for term, _ in self.items())
+
+    def __iter__(self):
+        return self.keys()
+
+    # Number of terms with at least one live posting, counted with one streaming pass per generation
+    def __len__(self):
+        with self.lock:
+            if self._term_count is None or self._term_count[0] != self.generation:
+                self._term_count = (self.generation, sum(1 for _ in self.items()))
+            return self._term_count[1]
+
+    # Average number of times every posting has been written to disk so far
+    def write_amplification(self):
+        return self.postings_written / self.postings_added if self.postings_added else 0.0
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self._save_state()
+            for index in self.levels.values():
+                index.close()
+
+
+# Adds the corpus one .sgm file at a time, then checks the result against a full rebuild
+# and compares the cost of adding the last file with rebuilding everything
+def compare_with_rebuild(directory, index_dir, aux_limit=AUX_POSTINGS_LIMIT):
+    from naive_indexer import build_naive_index
+    print("="*70)
+    print("INCREMENTAL UPDATES: LOGARITHMIC MERGING VS FULL REBUILD")
+    print("="*70)
+    index = DynamicIndex(index_dir, aux_limit)
+    add_time = 0.0
+    for filepath in sorted(glob.glob(os.path.join(directory, '*.sgm'))):
+        start_time = time.perf_counter()
+        index.add_file(filepath)
+        add_time = time.perf_counter() - start_time
+    index.flush()
+    start_time = time.perf_counter()
+    rebuilt = build_naive_index(directory)
+    rebuild_time = time.perf_counter() - start_time
+    if dict(index.items()) != rebuilt:
+        raise AssertionError("incrementally built index differs from the full rebuild")
+    print(f"DEBUG: adding the last file took {add_time:.2f} seconds, a full rebuild {rebuild_time:.2f} seconds")
+    print(f"DEBUG: {index.postings_added:,} postings added, {index.postings_written:,} written to disk in "
+          f"{index.merges} merges ({index.write_amplification():.2f} writes per posting), levels {sorted(index.levels)}")
+    index.close()
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import REUTERS_DIR
+    compare_with_rebuild(REUTERS_DIR, 'dynamic_index')
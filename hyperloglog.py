@@ -0,0 +1,41 @@
+import math, hashlib
+
+# Number of index bits: 2^14 one-byte registers, standard error about 1.04/sqrt(2^14) = 0.8%
+HLL_PRECISION = 14
+
+
+# HyperLogLog distinct counter (Flajolet et al. 2007)
+# Memory is 2^precision bytes whatever the number of distinct items, len() is an estimate
+# Exposes add/update/len so it can stand in for a set when only the number of distinct items is needed
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+        self.alpha = 0.7213 / (1 + 1.079 / self.num_registers)
+
+    def add(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'little')
+        register = value & (self.num_registers - 1)
+        remaining = value >> self.precision
+        # Position of the lowest set bit among the remaining 64 - precision bits
+        rank = (remaining & -remaining).bit_length() if remaining else 64 - self.precision + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        m = self.num_registers
+        estimate = self.alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction: linear counting
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def nbytes(self):
+        return len(self.registers)
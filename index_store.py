@@ -0,0 +1,348 @@
+import os, sys, mmap, struct, time, tempfile, shutil
+from array import array
+
+# ===================================
+# BINARY INDEX FILE FORMAT (version 3)
+# ===================================
+# All integers are little-endian.
+#
+#   header          magic, version, flags, term count, postings count, generation and section offsets
+#   postings        every postings list back to back, one uint32 docID per posting
+#   postings table  (terms + 1) uint64 start positions into the postings section, in postings
+#   term table      (terms + 1) uint64 start offsets into the term blob, in bytes
+#   term blob       every term in sorted order, UTF-8, concatenated
+#   [tf]            optional (FLAG_TF), one uint32 term frequency per posting, aligned with the postings
+#   [doc lengths]   optional (FLAG_DOC_LENGTHS), uint64 count then sorted (docID, length) uint32 pairs
+#   [max scores]    optional (FLAG_MAX_SCORES), BM25 k1 and b as float64, then one float64 per term: the largest
+#                   BM25 score the term contributes to any document (the upper bound WAND and MaxScore prune with)
+#
+# Postings come first so that an index can be written in a single streaming pass (see IndexWriter);
+# the tables, the term blob and the optional sections are appended once the last term has been added.
+# Version 1 (no optional sections) and version 2 files (no max scores) are still readable.
+
+MAGIC = b'IRIX'
+VERSION = 3
+PREAMBLE = struct.Struct('<4sHH')
+HEADERS = {
+    1: struct.Struct('<4sHHQQQQQQ'),
+    2: struct.Struct('<4sHHQQQQQQQQ'),
+    3: struct.Struct('<4sHHQQQQQQQQQ'),
+}
+HEADER = HEADERS[VERSION]
+OFFSET = struct.Struct('<Q')
+SCORE = struct.Struct('<d')
+SCORE_PARAMS = struct.Struct('<dd')
+FLAG_TF = 1
+FLAG_DOC_LENGTHS = 2
+FLAG_MAX_SCORES = 4
+
+# Raised when a file is not an index file of the expected format version
+class IndexFormatError(ValueError):
+    pass
+
+
+# Writes an index file one term at a time, terms must be added in sorted order
+# Only the (compact) term and offset tables are kept in memory, postings go straight to disk
+# (term frequencies are spooled to a temporary file and appended on close)
+# The file is written under a temporary name and renamed on close, so readers never see a partial index
+# max_scores: the (k1, b) BM25 parameters of the per-term max scores passed to add(), see ranked_retrieval
+class IndexWriter:
+    def __init__(self, path, with_tf=False, max_scores=None):
+        self.path = path
+        self.file = open(path + '.tmp', 'wb')
+        self.file.write(b'\0' * HEADER.size)
+        self.term_blob = bytearray()
+        self.term_offsets = array('Q', [0])
+        self.postings_offsets = array('Q', [0])
+        self.num_postings = 0
+        self.last_term = None
+        self.tf_file = tempfile.TemporaryFile() if with_tf else None
+        self.doc_lengths = None
+        self.score_params = max_scores
+        self.max_scores = array('d') if max_scores is not None else None
+
+    # tfs: term frequencies aligned with postings, required when the writer was created with_tf
+    # max_score: the term's BM25 max score, required when the writer was created with max_scores
+    # postings must strictly increase, lookups and the postings codecs rely on it
+    def add(self, term, postings, tfs=None, max_score=None):
+        if self.last_term is not None and term <= self.last_term:
+            raise ValueError(f"terms must be added in sorted order: {term!r} after {self.last_term!r}")
+        self.last_term = term
+        encoded = array('I', postings)
+        if any(previous >= docid for previous, docid in zip(encoded, encoded[1:])):
+            raise ValueError(f"postings of {term!r} must strictly increase")
+        if sys.byteorder == 'big':
+            encoded.byteswap()
+        self.file.write(encoded.tobytes())
+        if self.tf_file is not None:
+            if tfs is None or len(tfs) != len(encoded):
+                raise ValueError(f"term frequencies of {term!r} do not match its postings")
+            self.tf_file.write(_uint32_bytes(tfs))
+        if self.max_scores is not None:
+            if max_score is None:
+                raise ValueError(f"max score of {term!r} is missing")
+            self.max_scores.append(max_score)
+        self.num_postings += len(encoded)
+        self.postings_offsets.append(self.num_postings)
+        self.term_blob += term.encode('utf-8')
+        self.term_offsets.append(len(self.term_blob))
+
+    # Stores the length (number of index terms) of every document
+    def set_document_lengths(self, doc_lengths):
+        self.doc_lengths = doc_lengths
+
+    def close(self):
+        postings_table = HEADER.size + 4 * self.num_postings
+        term_table = postings_table + 8 * len(self.postings_offsets)
+        term_blob = term_table + 8 * len(self.term_offsets)
+        for table in (self.postings_offsets, self.term_offsets):
+            self.file.write(struct.pack(f'<{len(table)}Q', *table))
+        self.file.write(self.term_blob)
+
+        flags = 0
+        tf_section = doc_lengths_section = max_scores_section = 0
+        if self.tf_file is not None:
+            flags |= FLAG_TF
+            tf_section = self.file.tell()
+            self.tf_file.seek(0)
+            shutil.copyfileobj(self.tf_file, self.file)
+            self.tf_file.close()
+        if self.doc_lengths is not None:
+            flags |= FLAG_DOC_LENGTHS
+            doc_lengths_section = self.file.tell()
+            docids = sorted(self.doc_lengths)
+            self.file.write(OFFSET.pack(len(docids)))
+            self.file.write(_uint32_bytes(x for docid in docids for x in (docid, self.doc_lengths[docid])))
+        if self.max_scores is not None:
+            flags |= FLAG_MAX_SCORES
+            max_scores_section = self.file.tell()
+            self.file.write(SCORE_PARAMS.pack(*self.score_params))
+            if sys.byteorder == 'big':
+                self.max_scores.byteswap()
+            self.file.write(self.max_scores.tobytes())
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, flags, len(self.term_offsets) - 1, self.num_postings,
+                                    time.time_ns(), postings_table, term_table, term_blob,
+                                    tf_section, doc_lengths_section, max_scores_section))
+        self.file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    # Discards everything written so far, an existing index at path is left untouched
+    def abort(self):
+        self.file.close()
+        if self.tf_file is not None:
+            self.tf_file.close()
+        os.remove(self.path + '.tmp')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+def _uint32_bytes(numbers):
+    encoded = array('I', numbers)
+    if sys.byteorder == 'big':
+        encoded.byteswap()
+    return encoded.tobytes()
+
+def _uint32_array(data):
+    decoded = array('I')
+    decoded.frombytes(data)
+    if sys.byteorder == 'big':
+        decoded.byteswap()
+    return decoded
+
+
+# Writes a complete {term: postings} index to path
+# A {term: [(docID, tf), ...]} index (see naive_indexer.build_tf_index) is written with its term frequencies,
+# the document lengths derived from them and the BM25 max score of every term
+def write_index(index, path, with_tf=False):
+    max_scores = None
+    if with_tf:
+        from ranked_retrieval import RankedIndex
+        doc_lengths = {}
+        for postings in index.values():
+            for docid, tf in postings:
+                doc_lengths[docid] = doc_lengths.get(docid, 0) + tf
+        scorer = RankedIndex(None, doc_lengths)
+        max_scores = (scorer.k1, scorer.b)
+    with IndexWriter(path, with_tf, max_scores) as writer:
+        for term in sorted(index):
+            if with_tf:
+                postings = [docid for docid, _ in index[term]]
+                tfs = [tf for _, tf in index[term]]
+                writer.add(term, postings, tfs, scorer.max_score(postings, tfs))
+            else:
+                writer.add(term, index[term])
+        if with_tf:
+            writer.set_document_lengths(doc_lengths)
+    print(f"DEBUG: index with {len(index)} terms written to {path}")
+    return path
+
+
+# Read-only, memory-mapped view of an index file
+# Opening only reads the header: the term table is binary-searched in place and a postings
+# list is decoded only when its term is looked up, so startup cost does not depend on index size
+class DiskIndex:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < PREAMBLE.size:
+            raise IndexFormatError(f"{path} is too small to be an index file")
+        magic, version, self.flags = PREAMBLE.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise IndexFormatError(f"{path} is not an index file")
+        if version not in HEADERS:
+            raise IndexFormatError(f"{path} has format version {version}, expected at most {VERSION}")
+        header = HEADERS[version].unpack_from(self.data, 0)
+        (self.num_terms, self.num_postings, self.generation,
+         self.postings_table, self.term_table, self.term_blob) = header[3:9]
+        self.postings_start = HEADERS[version].size
+        # Sections missing from older versions are at offset 0
+        self.tf_section, self.doc_lengths_section, self.max_scores_section = (header[9:] + (0, 0, 0))[:3]
+        self._doc_lengths = None
+
+    def _offset(self, table, i):
+        return OFFSET.unpack_from(self.data, table + 8 * i)[0]
+
+    # Returns the i-th term of the sorted term table
+    def term_at(self, i):
+        start = self.term_blob + self._offset(self.term_table, i)
+        end = self.term_blob + self._offset(self.term_table, i + 1)
+        return self.data[start:end].decode('utf-8')
+
+    # Binary search over the term table, returns the term number or -1
+    def find(self, term):
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term_at(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.num_terms and self.term_at(lo) == term:
+            return lo
+        return -1
+
+    # Decodes the postings list of the i-th term
+    def postings_at(self, i):
+        start = self._offset(self.postings_table, i)
+        end = self._offset(self.postings_table, i + 1)
+        return _uint32_array(self.data[self.postings_start + 4 * start:self.postings_start + 4 * end]).tolist()
+
+    @property
+    def has_tf(self):
+        return bool(self.flags & FLAG_TF)
+
+    # Decodes the term frequencies of the i-th term, aligned with postings_at(i)
+    def tfs_at(self, i):
+        if not self.has_tf:
+            raise IndexFormatError(f"{self.path} was written without term frequencies")
+        start = self._offset(self.postings_table, i)
+        end = self._offset(self.postings_table, i + 1)
+        return _uint32_array(self.data[self.tf_section + 4 * start:self.tf_section + 4 * end]).tolist()
+
+    # Returns (docIDs, term frequencies) of a term, two empty lists if it is not indexed
+    def get_with_tf(self, term):
+        i = self.find(term)
+        if i < 0:
+            return [], []
+        return self.postings_at(i), self.tfs_at(i)
+
+    # {docID: length}, decoded on first use only
+    def document_lengths(self):
+        if self._doc_lengths is None:
+            if not self.flags & FLAG_DOC_LENGTHS:
+                raise IndexFormatError(f"{self.path} was written without document lengths")
+            count = OFFSET.unpack_from(self.data, self.doc_lengths_section)[0]
+            start = self.doc_lengths_section + OFFSET.size
+            pairs = _uint32_array(self.data[start:start + 8 * count])
+            self._doc_lengths = dict(zip(pairs[0::2], pairs[1::2]))
+        return self._doc_lengths
+
+    @property
+    def has_max_scores(self):
+        return bool(self.flags & FLAG_MAX_SCORES)
+
+    # (k1, b) the stored BM25 max scores were computed with
+    def score_params(self):
+        if not self.has_max_scores:
+            raise IndexFormatError(f"{self.path} was written without max scores")
+        return SCORE_PARAMS.unpack_from(self.data, self.max_scores_section)
+
+    # Stored BM25 max score of the i-th term
+    def max_score_at(self, i):
+        if not self.has_max_scores:
+            raise IndexFormatError(f"{self.path} was written without max scores")
+        return SCORE.unpack_from(self.data, self.max_scores_section + SCORE_PARAMS.size + SCORE.size * i)[0]
+
+    # Stored BM25 max score of a term, None if it is not indexed
+    def max_score(self, term):
+        i = self.find(term)
+        return self.max_score_at(i) if i >= 0 else None
+
+    def document_frequency(self, term):
+        i = self.find(term)
+        if i < 0:
+            return 0
+        return self._offset(self.postings_table, i + 1) - self._offset(self.postings_table, i)
+
+    def get(self, term, default=None):
+        i = self.find(term)
+        return self.postings_at(i) if i >= 0 else default
+
+    def __getitem__(self, term):
+        i = self.find(term)
+        if i < 0:
+            raise KeyError(term)
+        return self.postings_at(i)
+
+    def __contains__(self, term):
+        return self.find(term) >= 0
+
+    def __len__(self):
+        return self.num_terms
+
+    def __iter__(self):
+        return (self.term_at(i) for i in range(self.num_terms))
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        return ((self.term_at(i), self.postings_at(i)) for i in range(self.num_terms))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_index(path):
+    return DiskIndex(path)
+
+# Opens the index at path, building and persisting it first with build_fn() if it does not exist yet
+def load_or_build(path, build_fn):
+    if not os.path.exists(path):
+        print(f"DEBUG: {path} not found, building it once...")
+        write_index(build_fn(), path)
+    return open_index(path)
+
+
+# Optional human-readable export, one "term: [docIDs]" line per term
+def export_text(index, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for term, postings in sorted(index.items()):
+            f.write(f"{term}: {list(postings)}\n")
+    print(f"DEBUG: text export written to {path}")
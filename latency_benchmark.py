@@ -0,0 +1,151 @@
+import sys, json, time, random, platform, argparse
+from query_processor import _normalize, index_analyzer, lookup_singleQ, lookup_andQ
+
+# Document-frequency bands (inclusive lower bound, exclusive upper bound) the query sets are sampled from
+DF_BANDS = ((1, 10), (10, 100), (100, 1000), (1000, float('inf')))
+QUERIES_PER_BAND = 20
+SEED = 479
+WARMUP = 10
+REPETITIONS = 200
+# Relative slowdown of a percentile that compare_runs reports as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def _band_name(band):
+    low, high = band
+    return f"df {low}+" if high == float('inf') else f"df {low}-{high - 1}"
+
+# Samples reproducible query sets from an index: for every df band, QUERIES_PER_BAND single term queries
+# and as many AND queries pairing a term of the band with a term drawn from the whole vocabulary
+# Only terms that normalize to themselves (with the index's analyzer) are used, so the lookups find
+# exactly the sampled postings
+def sample_queries(index, per_band=QUERIES_PER_BAND, seed=SEED, bands=DF_BANDS):
+    rng = random.Random(seed)
+    analyzer = index_analyzer(index)
+    terms = sorted(term for term in index.keys() if _normalize(term, analyzer) == term)
+    query_sets = {}
+    for band in bands:
+        in_band = [term for term in terms if band[0] <= len(index[term]) < band[1]]
+        if not in_band:
+            continue
+        singles = [(term,) for term in rng.sample(in_band, min(per_band, len(in_band)))]
+        pairs = [(rng.choice(in_band), rng.choice(terms)) for _ in range(per_band)]
+        query_sets[_band_name(band) + " single"] = singles
+        query_sets[_band_name(band) + " AND"] = pairs
+    return query_sets
+
+# Runs queries through query_processor on any index with the {term: postings} interface
+def lookup_runner(index):
+    def run_query(query):
+        if len(query) == 1:
+            return lookup_singleQ(index, query[0])[0]
+        return lookup_andQ(index, *query)[0]
+    return run_query
+
+def _percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+def _summarize(samples):
+    samples.sort()
+    return {
+        'samples': len(samples),
+        'mean_us': sum(samples) / len(samples) / 1000,
+        'p50_us': _percentile(samples, 0.50) / 1000,
+        'p95_us': _percentile(samples, 0.95) / 1000,
+        'p99_us': _percentile(samples, 0.99) / 1000,
+    }
+
+
+# Measures the latency of every query set on every variant
+# variants: {name: run_query}, where run_query(query_tuple) evaluates one query (see lookup_runner)
+# Every query is run "warmup" times untimed, then timed individually with perf_counter_ns "repetitions" times
+# reference: optional variant name whose results every other variant must reproduce
+def run_benchmark(variants, query_sets, warmup=WARMUP, repetitions=REPETITIONS, reference=None):
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'warmup': warmup,
+            'repetitions': repetitions,
+            'queries': {name: [list(query) for query in queries] for name, queries in query_sets.items()},
+        },
+        'results': {},
+    }
+    for variant, run_query in variants.items():
+        report['results'][variant] = {}
+        for set_name, queries in query_sets.items():
+            samples = []
+            for query in queries:
+                if reference is not None and variant != reference:
+                    if list(run_query(query)) != list(variants[reference](query)):
+                        raise AssertionError(f"{variant} disagrees with {reference} on {query!r}")
+                for _ in range(warmup):
+                    run_query(query)
+                for _ in range(repetitions):
+                    start = time.perf_counter_ns()
+                    run_query(query)
+                    samples.append(time.perf_counter_ns() - start)
+            report['results'][variant][set_name] = _summarize(samples)
+    return report
+
+def print_benchmark(report):
+    print("="*86)
+    print(f"QUERY LATENCY ({report['meta']['repetitions']} repetitions after {report['meta']['warmup']} warmup runs)")
+    print("="*86)
+    print(f"{'variant':20} {'query set':22} {'mean':>10} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for variant, sets in report['results'].items():
+        for set_name, row in sets.items():
+            print(f"{variant:20} {set_name:22} {row['mean_us']:8.2f}us {row['p50_us']:8.2f}us "
+                  f"{row['p95_us']:8.2f}us {row['p99_us']:8.2f}us")
+    print("="*86)
+
+def write_benchmark(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"DEBUG: benchmark results written to {path}")
+
+def load_benchmark(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Compares two benchmark runs percentile by percentile
+# Returns the regressions: (variant, query set, percentile, old us, new us) slower by more than "threshold"
+def compare_runs(old_report, new_report, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    print(f"{'variant':20} {'query set':22} {'p50':>16} {'p95':>16} {'p99':>16}")
+    for variant, sets in new_report['results'].items():
+        for set_name, new_row in sets.items():
+            old_row = old_report['results'].get(variant, {}).get(set_name)
+            if old_row is None:
+                continue
+            changes = []
+            for percentile in ('p50_us', 'p95_us', 'p99_us'):
+                change = new_row[percentile] / old_row[percentile] - 1 if old_row[percentile] else 0.0
+                changes.append(f"{change:+15.1%}")
+                if change > threshold:
+                    regressions.append((variant, set_name, percentile, old_row[percentile], new_row[percentile]))
+            print(f"{variant:20} {set_name:22} " + " ".join(changes))
+    for variant, set_name, percentile, old, new in regressions:
+        print(f"DEBUG: regression in {variant} / {set_name}: {percentile} {old:.2f}us -> {new:.2f}us")
+    return regressions
+
+# Testing: benchmarks the naive index and the index file, optionally against a previous run
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query latency benchmark")
+    parser.add_argument('--output', default='latency_benchmark.json')
+    parser.add_argument('--baseline', help="previous run to compare against")
+    parser.add_argument('--repetitions', type=int, default=REPETITIONS)
+    args = parser.parse_args()
+
+    from naive_indexer import inverted_index
+    in_memory = dict(inverted_index.items())
+    query_sets = sample_queries(in_memory)
+    report = run_benchmark({'naive (dict)': lookup_runner(in_memory),
+                            'index file (mmap)': lookup_runner(inverted_index)},
+                           query_sets, repetitions=args.repetitions, reference='naive (dict)')
+    print_benchmark(report)
+    write_benchmark(report, args.output)
+    if args.baseline:
+        regressions = compare_runs(load_benchmark(args.baseline), report)
+        sys.exit(1 if regressions else 0)
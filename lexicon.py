@@ -0,0 +1,147 @@
+import sys
+from array import array
+from postings_codec import vbyte_append, vbyte_read
+
+# Number of terms per block (k = 4 in Section 5.2.2)
+LEXICON_BLOCK_SIZE = 4
+
+
+# Dictionary-as-a-string with blocking and front coding (Figures 5.5 - 5.7)
+# All terms live in one byte string. Within a block of block_size terms, the first term is stored in full
+# and each following term as (length of the prefix shared with the previous term, suffix).
+# Only one pointer per block is kept, the term number doubles as the pointer into the postings.
+class FrontCodedLexicon:
+    def __init__(self, sorted_terms, block_size=LEXICON_BLOCK_SIZE, front_coding=True):
+        self.block_size = block_size
+        self.front_coding = front_coding
+        self.num_terms = 0
+        string = bytearray()
+        self.block_pointers = array('I')
+        previous = b''
+        for term in sorted_terms:
+            encoded = term.encode('utf-8')
+            if self.num_terms and encoded <= previous:
+                raise ValueError(f"terms must be sorted and unique: {term!r}")
+            if self.num_terms % block_size == 0:
+                self.block_pointers.append(len(string))
+                prefix = 0
+            elif front_coding:
+                prefix = _common_prefix(previous, encoded)
+            else:
+                prefix = 0
+            vbyte_append(prefix, string)
+            vbyte_append(len(encoded) - prefix, string)
+            string += encoded[prefix:]
+            previous = encoded
+            self.num_terms += 1
+        self.string = bytes(string)
+
+    # Decodes the first term of a block, stored without front coding
+    def _block_head(self, block):
+        pos = self.block_pointers[block]
+        _, pos = vbyte_read(self.string, pos)
+        length, pos = vbyte_read(self.string, pos)
+        return self.string[pos:pos + length]
+
+    # Yields the (term number, encoded term) pairs of a block in order
+    def _scan_block(self, block):
+        pos = self.block_pointers[block]
+        first = block * self.block_size
+        last = min(first + self.block_size, self.num_terms)
+        term = b''
+        for i in range(first, last):
+            prefix, pos = vbyte_read(self.string, pos)
+            length, pos = vbyte_read(self.string, pos)
+            term = term[:prefix] + self.string[pos:pos + length]
+            pos += length
+            yield i, term
+
+    # Returns the term number of term, or -1
+    # Binary search over the block heads, then a linear scan of at most block_size terms
+    def find(self, term):
+        encoded = term.encode('utf-8')
+        lo, hi = 0, len(self.block_pointers)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._block_head(mid) <= encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return -1
+        for i, candidate in self._scan_block(lo - 1):
+            if candidate == encoded:
+                return i
+            if candidate > encoded:
+                break
+        return -1
+
+    def term_at(self, i):
+        for j, term in self._scan_block(i // self.block_size):
+            if j == i:
+                return term.decode('utf-8')
+        raise IndexError(i)
+
+    def __iter__(self):
+        for block in range(len(self.block_pointers)):
+            for _, term in self._scan_block(block):
+                yield term.decode('utf-8')
+
+    def __len__(self):
+        return self.num_terms
+
+    # Bytes used by the term string and the block pointers
+    def nbytes(self):
+        return len(self.string) + self.block_pointers.itemsize * len(self.block_pointers)
+
+def _common_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+# Inverted index whose terms are held by a FrontCodedLexicon instead of dict keys
+# Postings are kept as given (lists, CompressedPostings, ...) in an array aligned with the term numbers,
+# and the usual get()/[]/in interface means lookup_singleQ/lookup_andQ work unchanged
+class LexiconIndex:
+    def __init__(self, index, block_size=LEXICON_BLOCK_SIZE, front_coding=True):
+        terms = sorted(index)
+        self.lexicon = FrontCodedLexicon(terms, block_size, front_coding)
+        self.postings = [index[term] for term in terms]
+
+    def get(self, term, default=None):
+        i = self.lexicon.find(term)
+        return self.postings[i] if i >= 0 else default
+
+    def __getitem__(self, term):
+        i = self.lexicon.find(term)
+        if i < 0:
+            raise KeyError(term)
+        return self.postings[i]
+
+    def __contains__(self, term):
+        return self.lexicon.find(term) >= 0
+
+    def __len__(self):
+        return len(self.lexicon)
+
+    def __iter__(self):
+        return iter(self.lexicon)
+
+    def keys(self):
+        return iter(self.lexicon)
+
+    def items(self):
+        return zip(self.lexicon, self.postings)
+
+    # Bytes spent on the dictionary: term string, block pointers and one postings pointer per term
+    def dictionary_bytes(self):
+        return self.lexicon.nbytes() + sys.getsizeof(self.postings)
+
+
+# Bytes spent on the dictionary of a plain {term: postings} hash table:
+# the dict itself (hash, key and value pointers) plus one str object per term
+def hash_table_bytes(index):
+    return sys.getsizeof(index) + sum(sys.getsizeof(term) for term in index)
@@ -1,68 +1,36 @@
-#pip install nltk
-#pip install lxml
-
-import nltk,os,glob
-from bs4 import BeautifulSoup
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import RegexpTokenizer
-
-nltk.download('punkt') 
-nltk.download('punkt_tab')   
-nltk.download('stopwords')
-
-TOKENIZER = RegexpTokenizer(r"[A-Za-z0-9]+(?:'[\w]+)?")
-STOPWORDS = set(stopwords.words('english'))
-STEMMER = PorterStemmer()
+import os,sys,glob
+from sgm_reader import iter_sgm
+from analyzer import TOKENIZER, ENGLISH_STOPWORDS as STOPWORDS, DEFAULT_ANALYZER, print_stats
+from index_store import write_index, load_or_build, export_text
 
 # Extracts individual documents from a given .sgm file
+# Streams (newid, text) records one at a time instead of building a BeautifulSoup tree
 def parse_sgm(filepath):
-    with open(filepath, 'r', encoding='latin-1', errors='ignore') as f:
-        soup = BeautifulSoup(f.read(), 'lxml')
-    documents = []
-    for reuters_tag in soup.find_all('reuters'):
-        newid = int(reuters_tag.get('newid'))
-        text_tag = reuters_tag.find('text')
-        if not text_tag:
-            continue
-
-        title = text_tag.find('title')
-        dateline = text_tag.find('dateline')
-        body = text_tag.find('body')
-
-        components = []
-        if title: 
-            components.append(title.get_text(" ", strip=True))
-        if dateline: 
-            components.append(dateline.get_text(" ", strip=True))
-        if body:
-            components.append(body.get_text(" ", strip=True))
-        else:
-            #Fallback option in case there's no body
-            components.append(text_tag.get_text(" ", strip=True))
-        raw_text = " ".join(components)
-        documents.append((newid, raw_text))
-    print(f"DEBUG: {len(documents)} documents parsed.")
-    return documents
+    return iter_sgm(filepath)
 
 # Transforms tokens into terms using linguistic preprocessing
+# Case folding, stopword and short token removal, stemming: see analyzer.DEFAULT_ANALYZER,
+# which query_processor uses as well, so queries are normalized exactly like the indexed text
 def preprocess_tokenize(text):
-    #Case Folding
-    text = text.lower()
-    #Tokenization
-    tokens = TOKENIZER.tokenize(text)
-
-    #Performs stemming
-    #Removes stopwords and very short tokens
-    terms = []
-    for token in tokens:
-        if token not in STOPWORDS and len(token) >= 2:
-            stemmed_term = STEMMER.stem(token)
-            terms.append(stemmed_term)
-    return terms
+    return DEFAULT_ANALYZER.analyze(text)
+
+# Same preprocessing applied to already tokenized text (eg: records of the token cache, see token_cache.py)
+def preprocess_tokens(tokens):
+    return DEFAULT_ANALYZER.analyze_tokens(tokens)
+
+# Same preprocessing as preprocess_tokenize, but keeps the position of every term
+# Positions count tokens before stopword removal, so "bank of england" keeps its gap of 2
+def preprocess_positions(text):
+    return DEFAULT_ANALYZER.analyze_positions(TOKENIZER.tokenize(text))
+
+def preprocess_token_positions(tokens):
+    return DEFAULT_ANALYZER.analyze_positions(tokens)
 
 #Processes ALL documents and accumulate term-docID pairs in list F
-def process_documents(directory):
+#positional: accumulates (term, docID, position) triples instead (see positional_index.py)
+#token_cache: reads the tokenized documents from a token_cache.TokenCache instead of parsing the SGML
+#dedup: a near_duplicates.NearDuplicateDetector, near-duplicates are left out ("collapse") or only reported ("flag")
+def process_documents(directory, positional=False, token_cache=None, dedup=None):
     F = []
     total_docs = 0
     print("DEBUG: Building term-docID pairs...")
@@ -71,14 +39,26 @@ def process_documents(directory):
     for filepath in sgm_files:
         filename = os.path.basename(filepath)
         print(f"\nDEBUG: Processing {filename}...")
-        documents = parse_sgm(filepath)
-        for docid, text in documents:
-            terms = preprocess_tokenize(text)
-            F.extend((term,docid) for term in terms)
-        total_docs += len(documents)
+        if token_cache is not None:
+            documents = token_cache.iter_file(filepath)
+        else:
+            documents = ((docid, TOKENIZER.tokenize(text)) for docid, text in parse_sgm(filepath))
+        for docid, tokens in documents:
+            if dedup is not None and dedup.check(docid, preprocess_tokens(tokens)) is not None \
+                    and dedup.mode == 'collapse':
+                continue
+            if positional:
+                F.extend((term,docid,position) for term, position in preprocess_token_positions(tokens))
+            else:
+                terms = preprocess_tokens(tokens)
+                F.extend((term,docid) for term in terms)
+            total_docs += 1
 
     print(f"DEBUG: Processed {total_docs} documents from {len(sgm_files)} files")
     print(f"DEBUG: Generated {len(F)} term-docID pairs")
+    if dedup is not None:
+        dedup.print_report()
+    print_stats()
     return F
 
 #Sorts F alphabetically and removes duplicates
@@ -112,14 +92,47 @@ def build_inverted_index(F_final):
     return index
 
 
-reuters_dir = 'C:\\Users\\prowl\\Downloads\\reuters21578'    
-F = process_documents(reuters_dir)
-F_sorted = sort_cull(F)
-inverted_index = build_inverted_index(F_sorted)
+# Constructs an inverted index that keeps term frequencies, for ranked retrieval
+# Takes the raw pairs of process_documents(): duplicates are counted instead of culled
+# Hash Table (key: the term, value: its postings list of (docID, tf) pairs)
+def build_tf_index(F):
+    index = {}
+    for term, docid in sorted(F):
+        postings = index.setdefault(term, [])
+        if postings and postings[-1][0] == docid:
+            postings[-1] = (docid, postings[-1][1] + 1)
+        else:
+            postings.append((docid, 1))
+    print(f"DEBUG: Index contains {len(index)} unique terms (with term frequencies)")
+    return index
+
+# Location of the Reuters-21578 collection and of the persisted index
+REUTERS_DIR = os.environ.get('REUTERS_DIR', 'C:\\Users\\prowl\\Downloads\\reuters21578')
+INDEX_FILE = os.environ.get('INDEX_FILE', 'inverted_index.bin')
+
+# Runs the full naive pipeline over a directory of .sgm files
+def build_naive_index(directory=REUTERS_DIR):
+    F = process_documents(directory)
+    F_sorted = sort_cull(F)
+    return build_inverted_index(F_sorted)
+
+# Opens the persisted index through mmap, the corpus is only ever indexed when the file is missing
+def load_inverted_index(index_file=INDEX_FILE, directory=REUTERS_DIR):
+    return load_or_build(index_file, lambda: build_naive_index(directory))
+
+# "from naive_indexer import inverted_index" keeps working, but now loads lazily on first access
+# instead of re-indexing the whole corpus every time the module is imported
+def __getattr__(name):
+    if name == 'inverted_index':
+        index = load_inverted_index()
+        globals()['inverted_index'] = index
+        return index
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
-    # Written to file for convenient access
-    with open('inverted_index.txt', 'w', encoding='utf-8') as f:
-        for term, postings in sorted(inverted_index.items()):
-            f.write(f"{term}: {postings}\n")
-    print("DEBUG: written to file")
+    # Builds and persists the binary index, the text dump is an optional export (--text)
+    inverted_index = build_naive_index(REUTERS_DIR)
+    write_index(inverted_index, INDEX_FILE)
+    if '--text' in sys.argv:
+        # Written to file for convenient access
+        export_text(inverted_index, 'inverted_index.txt')
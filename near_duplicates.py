@@ -0,0 +1,136 @@
+import time, zlib
+import numpy as np
+
+# MinHash signature length, split into BANDS bands of NUM_PERM / BANDS rows for LSH (Section 19.6)
+# With 16 bands of 8 rows, pairs are likely to become candidates from a Jaccard similarity of ~(1/16)^(1/8) = 0.71
+NUM_PERM = 128
+BANDS = 16
+# Estimated Jaccard similarity of the shingle sets above which a document is a near-duplicate
+JACCARD_THRESHOLD = 0.8
+# Consecutive terms per shingle
+SHINGLE_SIZE = 3
+# Bytes of an index file per posting (one uint32 docID), used to report the space saved
+POSTING_BYTES = 4
+
+_PRIME = (1 << 31) - 1
+
+
+# Finds near-duplicate documents as they stream through an indexing pipeline, in roughly linear time:
+# every document gets a MinHash signature of its term shingles, and is only compared with the earlier
+# documents that share at least one LSH band with it. The first copy seen is kept as the canonical one.
+#   mode "collapse"  near-duplicates are left out of the index
+#   mode "flag"      near-duplicates are indexed, and reported in "duplicates" (docID -> canonical docID)
+class NearDuplicateDetector:
+    def __init__(self, mode='collapse', num_perm=NUM_PERM, bands=BANDS, threshold=JACCARD_THRESHOLD,
+                 shingle_size=SHINGLE_SIZE, seed=479):
+        if mode not in ('collapse', 'flag'):
+            raise ValueError(f"unknown dedup mode {mode!r}, expected 'collapse' or 'flag'")
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.mode = mode
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Random hash functions h(x) = (a x + b) mod p, one per signature position
+        self.a = rng.integers(1, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=(num_perm, 1), dtype=np.uint64)
+        # (band number, band values) -> canonical docIDs in that bucket
+        self.buckets = {}
+        self.signatures = {}
+        self.duplicates = {}
+        self.docs = 0
+        self.skipped = 0
+        self.postings_saved = 0
+        self.seconds = 0.0
+
+    # MinHash signature of the shingles of a document with at least shingle_size terms
+    def signature(self, terms):
+        if len(terms) < self.shingle_size:
+            raise ValueError(f"a signature needs at least {self.shingle_size} terms, got {len(terms)}")
+        shingles = {' '.join(terms[i:i + self.shingle_size]) for i in range(len(terms) - self.shingle_size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((self.a * hashes[None, :] + self.b) % _PRIME).min(axis=1).astype(np.uint32)
+
+    # Registers a document and returns the docID of the earlier document it duplicates, or None
+    # The caller skips the document in "collapse" mode
+    # Documents shorter than one shingle (empty ones included) have no shingles to compare and are never
+    # reported: they would all share the same signature
+    def check(self, docid, terms):
+        start = time.perf_counter()
+        self.docs += 1
+        if len(terms) < self.shingle_size:
+            self.skipped += 1
+            self.seconds += time.perf_counter() - start
+            return None
+        signature = self.signature(terms)
+        keys = [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        canonical = None
+        checked = set()
+        for key in keys:
+            for candidate in self.buckets.get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                if np.count_nonzero(self.signatures[candidate] == signature) / len(signature) >= self.threshold:
+                    canonical = candidate
+                    break
+            if canonical is not None:
+                break
+        if canonical is None:
+            self.signatures[docid] = signature
+            for key in keys:
+                self.buckets.setdefault(key, []).append(docid)
+        else:
+            self.duplicates[docid] = canonical
+            self.postings_saved += len(set(terms))
+        self.seconds += time.perf_counter() - start
+        return canonical
+
+    def report(self):
+        return {
+            'mode': self.mode,
+            'docs': self.docs,
+            'duplicates': len(self.duplicates),
+            'skipped': self.skipped,
+            'postings_saved': self.postings_saved,
+            'bytes_saved': self.postings_saved * POSTING_BYTES,
+            'seconds': self.seconds,
+            'docs_per_second': self.docs / self.seconds if self.seconds else 0.0,
+        }
+
+    def print_report(self):
+        report = self.report()
+        verb = "removed" if self.mode == 'collapse' else "flagged, removable"
+        print(f"DEBUG: dedup found {report['duplicates']:,} near-duplicates among {report['docs']:,} documents, "
+              f"{verb}: {report['postings_saved']:,} postings ({report['bytes_saved']:,} bytes), "
+              f"{report['skipped']:,} documents too short to compare")
+        print(f"DEBUG: dedup stage took {report['seconds']:.2f} seconds ({report['docs_per_second']:,.0f} docs/sec)")
+
+
+# Builds the naive index with and without the dedup stage and reports what collapsing saves
+def compare_dedup(directory):
+    from naive_indexer import process_documents, sort_cull, build_inverted_index
+    print("="*70)
+    print("NEAR-DUPLICATE DETECTION BEFORE INDEXING")
+    print("="*70)
+    start_time = time.perf_counter()
+    plain = build_inverted_index(sort_cull(process_documents(directory)))
+    plain_time = time.perf_counter() - start_time
+    detector = NearDuplicateDetector('collapse')
+    start_time = time.perf_counter()
+    deduped = build_inverted_index(sort_cull(process_documents(directory, dedup=detector)))
+    dedup_time = time.perf_counter() - start_time
+    plain_postings = sum(len(postings) for postings in plain.values())
+    dedup_postings = sum(len(postings) for postings in deduped.values())
+    if plain_postings - dedup_postings != detector.postings_saved:
+        raise AssertionError("postings saved do not match the difference between the two indexes")
+    detector.print_report()
+    print(f"DEBUG: postings {plain_postings:,} -> {dedup_postings:,}, build time {plain_time:.2f} -> "
+          f"{dedup_time:.2f} seconds")
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import REUTERS_DIR
+    compare_dedup(REUTERS_DIR)
@@ -0,0 +1,103 @@
+import os, glob, time, functools
+from multiprocessing import Pool
+from collections import defaultdict
+
+from naive_indexer import parse_sgm, preprocess_tokenize
+from naive_indexer import process_documents, sort_cull, build_inverted_index
+
+# Number of documents shipped to a worker at a time
+# Small enough to keep every core busy, large enough to amortize pickling
+BATCH_SIZE = 250
+
+
+# Streams the corpus as batches of (docID, text) pairs in file/docID order
+# Parsing is cheap next to stemming, so it stays in the parent process
+def iter_batches(directory, batch_size=BATCH_SIZE):
+    batch = []
+    sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
+    for filepath in sgm_files:
+        for docid, text in parse_sgm(filepath):
+            batch.append((docid, text))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+# Runs inside a worker: tokenizes and stems one batch into a partial inverted index
+# Returns (partial index, number of documents in the batch)
+# record_tf: postings hold (docID, tf) pairs instead of bare docIDs
+def index_batch(batch, record_tf=False):
+    partial = defaultdict(list)
+    for docid, text in batch:
+        for term in preprocess_tokenize(text):
+            postings = partial[term]
+            if record_tf:
+                if postings and postings[-1][0] == docid:
+                    postings[-1] = (docid, postings[-1][1] + 1)
+                else:
+                    postings.append((docid, 1))
+            elif not postings or postings[-1] != docid:
+                postings.append(docid)
+    return dict(partial), len(batch)
+
+# Merges partial indexes into docID-sorted postings lists
+# Partials arrive in batch order, so postings are normally already sorted and only need to be appended
+def merge_partials(partials):
+    merged = defaultdict(list)
+    for partial in partials:
+        for term, postings in partial.items():
+            merged_postings = merged[term]
+            if merged_postings and merged_postings[-1] >= postings[0]:
+                # Out-of-order docIDs (eg: files not sorted by NEWID), fall back to a full sort
+                merged[term] = sorted(set(merged_postings).union(postings))
+            else:
+                merged_postings.extend(postings)
+    return dict(merged)
+
+# Builds the inverted index on a process pool with "workers" processes
+# Produces exactly the postings of the serial naive/SPIMI builders
+def build_parallel_index(directory, workers=None, batch_size=BATCH_SIZE, record_tf=False):
+    workers = workers or os.cpu_count()
+    print(f"DEBUG: building index with {workers} worker processes...")
+    start_time = time.perf_counter()
+
+    total_docs = 0
+    partials = []
+    index_fn = functools.partial(index_batch, record_tf=record_tf)
+    with Pool(processes=workers) as pool:
+        for partial, num_docs in pool.imap(index_fn, iter_batches(directory, batch_size)):
+            partials.append(partial)
+            total_docs += num_docs
+    inverted_index = merge_partials(partials)
+
+    elapsed_time = time.perf_counter() - start_time
+    print(f"DEBUG: indexed {total_docs} documents into {len(inverted_index)} terms "
+          f"in {elapsed_time:.2f} seconds")
+    return inverted_index, elapsed_time, total_docs
+
+
+# Checks the parallel index for exact equality with the serial naive index
+# and reports the speedup for each worker count
+def compare_with_serial(directory, worker_counts=(1, 2, 4, 8)):
+    print("="*70)
+    print("SCALING COMPARISON: PARALLEL VS SERIAL")
+    print("="*70)
+
+    serial_start = time.perf_counter()
+    serial_index = build_inverted_index(sort_cull(process_documents(directory)))
+    serial_time = time.perf_counter() - serial_start
+    print(f"\nDEBUG: serial build took {serial_time:.2f} seconds")
+
+    for workers in worker_counts:
+        parallel_index, parallel_time, _ = build_parallel_index(directory, workers)
+        identical = parallel_index == serial_index
+        print(f"DEBUG: {workers} workers took {parallel_time:.2f} seconds, "
+              f"speedup {serial_time/parallel_time:.2f}x, identical to serial: {identical}")
+        if not identical:
+            raise AssertionError(f"parallel index with {workers} workers differs from the serial index")
+
+# Testing
+if __name__ == "__main__":
+    reuters_dir = 'C:\\Users\\prowl\\Downloads\\reuters21578'
+    compare_with_serial(reuters_dir)
@@ -0,0 +1,201 @@
+import os, glob, time
+from bisect import bisect_left
+from collections import defaultdict
+
+from naive_indexer import REUTERS_DIR, parse_sgm, preprocess_positions
+from postings_codec import encode_postings, decode_postings
+from query_processor import lookup_andQ, choose_intersection
+
+
+# Positional index (Section 2.4.2): for every term, its docID-sorted postings and, per posting,
+# the positions of the term in that document as gap-encoded variable byte codes.
+# get() returns the plain docID list, so the index also serves lookup_singleQ/lookup_andQ,
+# and positions are only decoded by phrase/proximity queries for the candidate documents.
+class PositionalIndex:
+    def __init__(self):
+        # term -> (docIDs, encoded position lists aligned with the docIDs)
+        self.terms = {}
+
+    # Naive, sort-based construction from the sorted (term, docID, position) triples
+    # of process_documents(directory, positional=True)
+    @classmethod
+    def from_triples(cls, F_sorted):
+        index = cls()
+        current = None
+        positions = []
+        for term, docid, position in F_sorted:
+            if (term, docid) != current:
+                if current is not None:
+                    index._append(current[0], current[1], positions)
+                current = (term, docid)
+                positions = []
+            if not positions or positions[-1] != position:
+                positions.append(position)
+        if current is not None:
+            index._append(current[0], current[1], positions)
+        return index
+
+    # SPIMI-style construction: appends one document at a time, docIDs must arrive in increasing order
+    def add_document(self, docid, term_positions):
+        by_term = defaultdict(list)
+        for term, position in term_positions:
+            by_term[term].append(position)
+        for term, positions in by_term.items():
+            self._append(term, docid, positions)
+
+    def _append(self, term, docid, positions):
+        entry = self.terms.get(term)
+        if entry is None:
+            entry = self.terms[term] = ([], [])
+        entry[0].append(docid)
+        entry[1].append(encode_postings(positions))
+
+    # Decodes the positions of term in docid, [] if the term does not occur in it
+    def positions(self, term, docid):
+        docids, encoded = self.terms.get(term, ((), ()))
+        i = bisect_left(docids, docid)
+        if i < len(docids) and docids[i] == docid:
+            return decode_postings(encoded[i])
+        return []
+
+    def document_frequency(self, term):
+        entry = self.terms.get(term)
+        return len(entry[0]) if entry else 0
+
+    def get(self, term, default=None):
+        entry = self.terms.get(term)
+        return entry[0] if entry else default
+
+    def __getitem__(self, term):
+        return self.terms[term][0]
+
+    def __contains__(self, term):
+        return term in self.terms
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def keys(self):
+        return self.terms.keys()
+
+    def items(self):
+        return ((term, entry[0]) for term, entry in self.terms.items())
+
+    # Bytes of the gap-encoded docIDs and of the gap-encoded positions
+    def size_report(self):
+        docid_bytes = sum(len(encode_postings(docids)) for docids, _ in self.terms.values())
+        position_bytes = sum(len(encoded) for _, positions in self.terms.values() for encoded in positions)
+        return {'docid_bytes': docid_bytes, 'position_bytes': position_bytes,
+                'overhead': position_bytes / docid_bytes if docid_bytes else 0.0}
+
+
+# Builds a positional index over a directory of .sgm files in a single SPIMI-style pass
+def build_positional_index(directory=REUTERS_DIR):
+    index = PositionalIndex()
+    total_docs = 0
+    sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
+    for filepath in sgm_files:
+        for docid, text in parse_sgm(filepath):
+            index.add_document(docid, preprocess_positions(text))
+            total_docs += 1
+    print(f"DEBUG: positional index built over {total_docs} documents with {len(index)} terms")
+    return index
+
+
+# Document-level AND of the query terms, rarest first, before any position is decoded
+def _candidate_documents(index, terms):
+    postings = sorted((index.get(term, []) for term in set(terms)), key=len)
+    if not postings or not postings[0]:
+        return []
+    candidates = postings[0]
+    for next_postings in postings[1:]:
+        if not candidates:
+            break
+        candidates = choose_intersection(candidates, next_postings)(candidates, next_postings)
+    return candidates
+
+# Phrase query: documents in which the query terms occur at the same relative positions as in the phrase
+# Stopwords are skipped on both sides, so "bank of england" matches "bank of england" but not "england bank"
+# stats, if given, receives the number of position lists decoded
+def phrase_query(index, phrase, stats=None):
+    start_time = time.perf_counter()
+    query = preprocess_positions(phrase)
+    # Rarest terms first, so most candidates are rejected after decoding a single short position list
+    query.sort(key=lambda pair: index.document_frequency(pair[0]))
+    decoded = 0
+    result = []
+    for docid in _candidate_documents(index, [term for term, _ in query]):
+        starts = None
+        for term, offset in query:
+            shifted = {position - offset for position in index.positions(term, docid)}
+            decoded += 1
+            starts = shifted if starts is None else starts & shifted
+            if not starts:
+                break
+        if starts:
+            result.append(docid)
+    if stats is not None:
+        stats['decoded'] = decoded
+    elapsed_time = time.perf_counter() - start_time
+    return result, elapsed_time
+
+# Implements Figure 2.12 from the textbook
+# Proximity query: documents in which term1 and term2 occur within k positions of each other
+def proximity_query(index, term1, term2, k):
+    start_time = time.perf_counter()
+    terms1, terms2 = preprocess_positions(term1), preprocess_positions(term2)
+    result = []
+    if not terms1 or not terms2:
+        # Stopwords and very short tokens are not indexed
+        return result, time.perf_counter() - start_time
+    t1, t2 = terms1[0][0], terms2[0][0]
+    for docid in _candidate_documents(index, [t1, t2]):
+        pp1, pp2 = index.positions(t1, docid), index.positions(t2, docid)
+        i = j = 0
+        while i < len(pp1) and j < len(pp2):
+            if abs(pp1[i] - pp2[j]) <= k:
+                result.append(docid)
+                break
+            if pp1[i] < pp2[j]:
+                i += 1
+            else:
+                j += 1
+    elapsed_time = time.perf_counter() - start_time
+    return result, elapsed_time
+
+
+# Reports the extra size of the positions and compares phrase query latency with the plain AND query
+def compare_phrase_queries(index, phrases, repetitions=100):
+    sizes = index.size_report()
+    print("="*70)
+    print("POSITIONAL INDEX")
+    print("="*70)
+    print(f"DEBUG: docIDs take {sizes['docid_bytes']:,} bytes, positions take {sizes['position_bytes']:,} bytes "
+          f"({sizes['overhead']:.1f}x the non-positional postings)")
+    for phrase in phrases:
+        # Stopwords are not indexed, so the AND query only gets the indexed words of the phrase
+        words = [word for word in phrase.split() if preprocess_positions(word)]
+        and_result, _ = lookup_andQ(index, *words)
+        stats = {}
+        phrase_result, _ = phrase_query(index, phrase, stats)
+        start_time = time.perf_counter()
+        for _ in range(repetitions):
+            lookup_andQ(index, *words)
+        and_time = (time.perf_counter() - start_time) / repetitions
+        start_time = time.perf_counter()
+        for _ in range(repetitions):
+            phrase_query(index, phrase)
+        phrase_time = (time.perf_counter() - start_time) / repetitions
+        print(f"'{phrase}': AND matches {len(and_result)} docs in {and_time * 1e6:.1f}us, "
+              f"phrase matches {len(phrase_result)} docs in {phrase_time * 1e6:.1f}us "
+              f"({stats['decoded']} position lists decoded)")
+
+# Testing
+if __name__ == "__main__":
+    positional_index = build_positional_index(REUTERS_DIR)
+    print("Searching up phrase 'supreme court':", phrase_query(positional_index, "supreme court"))
+    print("Searching up 'cold' within 3 words of 'war':", proximity_query(positional_index, "cold", "war", 3))
+    compare_phrase_queries(positional_index, ["supreme court", "cold war", "bank of england", "american motors"])
@@ -0,0 +1,202 @@
+# ==================================
+# POSTINGS COMPRESSION (Chapter 5.3)
+# ==================================
+
+# Replaces docIDs by the gaps between consecutive docIDs (the first docID is kept as-is)
+# docIDs must strictly increase, so every gap after the first is >= 1
+def to_gaps(postings):
+    previous = 0
+    gaps = []
+    for docid in postings:
+        if gaps and docid <= previous:
+            raise ValueError(f"postings must strictly increase: docID {docid} after {previous}")
+        gaps.append(docid - previous)
+        previous = docid
+    return gaps
+
+# Inverse of to_gaps()
+def from_gaps(gaps):
+    docid = 0
+    postings = []
+    for gap in gaps:
+        docid += gap
+        postings.append(docid)
+    return postings
+
+# Appends the variable byte code of n to out (Figure 5.8)
+# 7 payload bits per byte, most significant first, the high bit marks the last byte of a number
+def vbyte_append(n, out):
+    if n < 0:
+        raise ValueError(f"variable byte codes only encode non-negative integers, got {n}")
+    chunk = bytearray([128 | (n & 127)])
+    n >>= 7
+    while n:
+        chunk.append(n & 127)
+        n >>= 7
+    chunk.reverse()
+    out += chunk
+
+# Encodes a sequence of non-negative integers with variable byte codes
+def vbyte_encode(numbers):
+    out = bytearray()
+    for n in numbers:
+        vbyte_append(n, out)
+    return bytes(out)
+
+# Reads one variable byte code from data starting at pos, returns (number, next pos)
+def vbyte_read(data, pos):
+    n = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        if byte & 128:
+            return (n << 7) | (byte & 127), pos
+        n = (n << 7) | byte
+
+# Decodes "count" variable byte codes from data starting at pos, returns (numbers, next pos)
+def vbyte_decode(data, pos=0, count=None):
+    numbers = []
+    end = len(data)
+    while pos < end and (count is None or len(numbers) < count):
+        n, pos = vbyte_read(data, pos)
+        numbers.append(n)
+    return numbers, pos
+
+# Gap + variable byte encoding of a docID-sorted postings list
+def encode_postings(postings):
+    return vbyte_encode(to_gaps(postings))
+
+def decode_postings(data):
+    return from_gaps(vbyte_decode(data)[0])
+
+# Elias gamma code of n >= 1 as a bit string (Table 5.5)
+# unary code of the offset length, then the offset (n in binary without its leading 1)
+def gamma_bits(n):
+    if n < 1:
+        raise ValueError(f"gamma codes only encode integers >= 1, got {n}")
+    offset = bin(n)[3:]
+    return '1' * len(offset) + '0' + offset
+
+# Elias delta code of n >= 1 as a bit string: gamma-coded length, then the offset
+def delta_bits(n):
+    if n < 1:
+        raise ValueError(f"delta codes only encode integers >= 1, got {n}")
+    offset = bin(n)[3:]
+    return gamma_bits(len(offset) + 1) + offset
+
+# Packs a bit string into bytes, padding the last byte with zeros
+def pack_bits(bits):
+    if not bits:
+        return b''
+    padding = -len(bits) % 8
+    return int(bits + '0' * padding, 2).to_bytes((len(bits) + padding) // 8, 'big')
+
+def unpack_bits(data):
+    return bin(int.from_bytes(data, 'big'))[2:].zfill(8 * len(data))
+
+# Yields "count" gamma-coded numbers from data
+def iter_gamma(data, count):
+    bits = unpack_bits(data)
+    pos = 0
+    for _ in range(count):
+        zero = bits.index('0', pos)
+        length = zero - pos
+        pos = zero + 1 + length
+        yield int('1' + bits[zero + 1:pos], 2)
+
+# Yields "count" delta-coded numbers from data
+def iter_delta(data, count):
+    bits = unpack_bits(data)
+    pos = 0
+    for _ in range(count):
+        zero = bits.index('0', pos)
+        length = int('1' + bits[zero + 1:2 * zero - pos + 1], 2) - 1
+        pos = 2 * zero - pos + 1
+        yield int('1' + bits[pos:pos + length], 2)
+        pos += length
+
+# Yields "count" variable byte coded numbers from data
+def iter_vbyte(data, count):
+    pos = 0
+    for _ in range(count):
+        n, pos = vbyte_read(data, pos)
+        yield n
+
+# Each codec turns a list of gaps (all >= 1) into bytes and back into an iterator of gaps
+CODECS = {
+    'vbyte': (vbyte_encode, iter_vbyte),
+    'gamma': (lambda gaps: pack_bits(''.join(map(gamma_bits, gaps))), iter_gamma),
+    'delta': (lambda gaps: pack_bits(''.join(map(delta_bits, gaps))), iter_delta),
+}
+
+
+# Gap-encoded, compressed postings list
+# Iterating decodes the docIDs lazily, so intersections can run directly over the compressed lists
+# The first gap is counted from -1 instead of 0, so a postings list starting at docID 0 still has
+# every gap >= 1, as the gamma and delta codes require
+class CompressedPostings:
+    __slots__ = ('data', 'count', 'codec')
+
+    def __init__(self, postings, codec='vbyte'):
+        if codec not in CODECS:
+            raise ValueError(f"unknown codec {codec!r}, expected one of {sorted(CODECS)}")
+        gaps = to_gaps(postings)
+        if gaps:
+            gaps[0] += 1
+        self.data = CODECS[codec][0](gaps)
+        self.count = len(postings)
+        self.codec = codec
+
+    def __iter__(self):
+        docid = -1
+        for gap in CODECS[self.codec][1](self.data, self.count):
+            docid += gap
+            yield docid
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"CompressedPostings({list(self)!r}, codec={self.codec!r})"
+
+# Compresses every postings list of a {term: postings} index with the given codec
+# An index that carries the analyzer that built it (analyzer.AnalyzedIndex) keeps it
+def compress_index(index, codec='vbyte'):
+    compressed = {term: CompressedPostings(postings, codec) for term, postings in index.items()}
+    if hasattr(index, 'analyzer'):
+        from analyzer import AnalyzedIndex
+        compressed = AnalyzedIndex(compressed, index.analyzer)
+    return compressed
+
+# Intersects two docID-sorted postings iterables, one element at a time (Figure 1.6)
+# Neither input is materialized, so compressed lists are decoded only as far as needed
+def intersect_iter(p1, p2):
+    it1, it2 = iter(p1), iter(p2)
+    doc1 = next(it1, None)
+    doc2 = next(it2, None)
+    while doc1 is not None and doc2 is not None:
+        if doc1 == doc2:
+            yield doc1
+            doc1 = next(it1, None)
+            doc2 = next(it2, None)
+        elif doc1 < doc2:
+            doc1 = next(it1, None)
+        else:
+            doc2 = next(it2, None)
+
+# Testing
+if __name__ == "__main__":
+    for postings in ([0], [0, 1, 2, 1000], [1, 5, 130, 131, 70000], []):
+        for codec in CODECS:
+            decoded = list(CompressedPostings(postings, codec))
+            if decoded != postings:
+                raise AssertionError(f"{codec} round trip of {postings} returned {decoded}")
+        if decode_postings(encode_postings(postings)) != postings:
+            raise AssertionError(f"vbyte round trip of {postings} failed")
+    print(f"DEBUG: {', '.join(CODECS)} round trips passed, docID 0 included")
@@ -0,0 +1,192 @@
+import sys, time
+from collections import OrderedDict
+from query_processor import _normalize, index_analyzer, choose_intersection
+
+# Default memory bounds of the two cache levels (in bytes)
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
+PAIR_CACHE_BYTES = 32 * 1024 * 1024
+# A term pair is cached once it has been intersected this many times
+PAIR_ADMISSION_COUNT = 2
+# Bound on the number of term pairs whose frequency is being tracked
+PAIR_TRACKING_LIMIT = 100000
+
+
+# Approximate footprint of a cached docID list: the list itself plus one int object per entry
+def _result_bytes(key, result):
+    return sys.getsizeof(key) + sys.getsizeof(result) + 28 * len(result)
+
+
+# Least-recently-used cache bounded by the (approximate) memory of its entries
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        size = _result_bytes(key, value)
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+        self.entries[key] = (value, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Identifies the current contents of an index
+# Index files (DiskIndex) and updatable indexes (DynamicIndex) expose a "generation" that changes on every
+# rebuild or update. Nothing cheap identifies the contents of a plain dict (appending to a postings list
+# changes neither its identity nor its length), so an index without a generation is rejected
+def index_generation(index):
+    generation = getattr(index, 'generation', None)
+    if generation is None:
+        raise TypeError(f"{type(index).__name__} has no generation counter: use an index that exposes one, "
+                        f"or pass static=True and call invalidate() after every change")
+    return generation
+
+
+# Two-level cache in front of query_processor:
+#   result cache  final answers, keyed by the normalized query
+#   pair cache    intersections of the two rarest terms of frequent AND queries, shared across queries
+# Both levels are dropped automatically as soon as the index generation changes.
+# static: the index has no generation (eg: a plain dict), the caller calls invalidate() whenever it changes
+# Cached lists are shared between callers and must not be modified.
+class CachedQueryProcessor:
+    def __init__(self, index, result_bytes=RESULT_CACHE_BYTES, pair_bytes=PAIR_CACHE_BYTES, static=False):
+        self.index = index
+        self.static = static
+        self.results = LRUCache(result_bytes)
+        self.pairs = LRUCache(pair_bytes)
+        self.pair_counts = {}
+        self.generation = None if static else index_generation(index)
+        self.invalidations = 0
+
+    # Clears both levels if the underlying index has changed since they were filled
+    def _check_generation(self):
+        if self.static:
+            return
+        generation = index_generation(self.index)
+        if generation != self.generation:
+            self.invalidate()
+            self.generation = generation
+
+    def invalidate(self):
+        self.results.clear()
+        self.pairs.clear()
+        self.pair_counts.clear()
+        self.invalidations += 1
+
+    def _intersect_pair(self, term1, term2, p1, p2):
+        key = (term1, term2)
+        cached = self.pairs.get(key)
+        if cached is not None:
+            return cached
+        result = choose_intersection(p1, p2)(p1, p2)
+        count = self.pair_counts.get(key, 0) + 1
+        if len(self.pair_counts) >= PAIR_TRACKING_LIMIT:
+            self.pair_counts.clear()
+        self.pair_counts[key] = count
+        if count >= PAIR_ADMISSION_COUNT:
+            self.pairs.put(key, result)
+        return result
+
+    # Same interface as query_processor.lookup_singleQ
+    def lookup_singleQ(self, term):
+        start_time = time.perf_counter()
+        self._check_generation()
+        key = ('single', _normalize(term, index_analyzer(self.index)))
+        result = self.results.get(key)
+        if result is None:
+            result = sorted(self.index.get(key[1], []))
+            self.results.put(key, result)
+        return result, time.perf_counter() - start_time
+
+    # Same interface as query_processor.lookup_andQ
+    def lookup_andQ(self, *terms):
+        if not terms:
+            return [], 0.0
+        start_time = time.perf_counter()
+        self._check_generation()
+        analyzer = index_analyzer(self.index)
+        normalized = tuple(sorted({_normalize(t, analyzer) for t in terms}))
+        key = ('and', normalized)
+        result = self.results.get(key)
+        if result is None:
+            result = self._evaluate_and(normalized)
+            self.results.put(key, result)
+        return result, time.perf_counter() - start_time
+
+    def _evaluate_and(self, normalized):
+        term_postings = []
+        for term in normalized:
+            postings = self.index.get(term, [])
+            if not postings:
+                return []
+            term_postings.append((term, postings))
+        # Shortest postings first, as in lookup_andQ
+        term_postings.sort(key=lambda pair: len(pair[1]))
+        if len(term_postings) == 1:
+            return sorted(term_postings[0][1])
+        (term1, p1), (term2, p2) = term_postings[0], term_postings[1]
+        result = self._intersect_pair(*sorted((term1, term2)), p1, p2)
+        for _, next_postings in term_postings[2:]:
+            if not result:
+                break
+            result = choose_intersection(result, next_postings)(result, next_postings)
+        return result
+
+    def stats(self):
+        return {'results': self.results.stats(), 'pairs': self.pairs.stats(),
+                'invalidations': self.invalidations}
+
+    def print_stats(self):
+        for level in ('results', 'pairs'):
+            stats = self.stats()[level]
+            print(f"DEBUG: {level} cache holds {stats['entries']:,} entries ({stats['bytes']:,} of "
+                  f"{stats['max_bytes']:,} bytes), {stats['hits']:,} hits, {stats['misses']:,} misses, "
+                  f"{stats['evictions']:,} evictions, hit rate {stats['hit_rate']:.1%}")
+        print(f"DEBUG: caches invalidated {self.invalidations} times")
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import inverted_index
+    processor = CachedQueryProcessor(inverted_index)
+    for _ in range(3):
+        processor.lookup_singleQ("bankruptcy")
+        processor.lookup_singleQ("lawsuit")
+        processor.lookup_andQ("supreme", "court")
+        processor.lookup_andQ("supreme", "court", "ruling")
+    processor.print_stats()
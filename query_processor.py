@@ -1,12 +1,16 @@
-import time
-from nltk.stem import PorterStemmer
+import math, time
+from bisect import bisect_left
 from typing import Dict, List, Iterable
+from analyzer import DEFAULT_ANALYZER
 
-STEMMER = PorterStemmer()
+# Analyzer that built an index: the one the index carries (eg: analyzer.AnalyzedIndex),
+# the project's default analyzer otherwise
+def index_analyzer(index):
+    return getattr(index, 'analyzer', DEFAULT_ANALYZER)
 
-# Performs query normalization
-def _normalize(term: str) -> str:
-    return STEMMER.stem(term.lower())
+# Performs query normalization, with the analyzer that built the index (see analyzer.Analyzer.normalize)
+def _normalize(term: str, analyzer=DEFAULT_ANALYZER) -> str:
+    return analyzer.normalize(term)
 
 # Implements Figure 1.6 from the textbook
 # Evaluates the intersection of two postings lists p1 and p2
@@ -24,29 +28,96 @@ def intersect_postings(p1, p2):
             j += 1
     return answer
 
+# Implements Figure 2.10 from the textbook
+# Intersection with skip pointers, placed implicitly every sqrt(n) positions of each list
+def intersect_with_skips(p1, p2):
+    answer = []
+    skip1 = max(1, int(math.sqrt(len(p1))))
+    skip2 = max(1, int(math.sqrt(len(p2))))
+    i, j = 0, 0
+    while i < len(p1) and j < len(p2):
+        if p1[i] == p2[j]:
+            answer.append(p1[i])
+            i += 1
+            j += 1
+        elif p1[i] < p2[j]:
+            if i % skip1 == 0 and i + skip1 < len(p1) and p1[i + skip1] <= p2[j]:
+                while i % skip1 == 0 and i + skip1 < len(p1) and p1[i + skip1] <= p2[j]:
+                    i += skip1
+            else:
+                i += 1
+        else:
+            if j % skip2 == 0 and j + skip2 < len(p2) and p2[j + skip2] <= p1[i]:
+                while j % skip2 == 0 and j + skip2 < len(p2) and p2[j + skip2] <= p1[i]:
+                    j += skip2
+            else:
+                j += 1
+    return answer
+
+# Intersects a short list with a much longer one by galloping (exponential) search
+# Costs O(|short| log(|long|/|short|)) instead of O(|short| + |long|)
+def intersect_galloping(short, long):
+    if len(short) > len(long):
+        short, long = long, short
+    answer = []
+    lo = 0
+    n = len(long)
+    for docid in short:
+        # Doubles the step until it overshoots docid, then binary searches the last step
+        step = 1
+        hi = lo
+        while hi < n and long[hi] < docid:
+            lo = hi + 1
+            hi += step
+            step <<= 1
+        lo = bisect_left(long, docid, lo, min(hi + 1, n))
+        if lo == n:
+            break
+        if long[lo] == docid:
+            answer.append(docid)
+            lo += 1
+    return answer
+
+# Length ratios (longer/shorter) above which skips, then galloping, beat the linear merge
+SKIP_RATIO = 4
+GALLOP_RATIO = 32
+
+# Picks the intersection strategy from the ratio of the postings list lengths
+def choose_intersection(p1, p2):
+    short, long = (p1, p2) if len(p1) <= len(p2) else (p2, p1)
+    ratio = len(long) / max(len(short), 1)
+    if ratio >= GALLOP_RATIO:
+        return intersect_galloping
+    if ratio >= SKIP_RATIO:
+        return intersect_with_skips
+    return intersect_postings
+
 # Processes a single term query
-def lookup_singleQ(index: Dict[str, List[int]], term: str) -> List[int]:
-    start_time = time.time()
-    result = sorted(index.get(_normalize(term), []))
-    end_time = time.time()
+# analyzer: the analyzer that built the index, by default the one it carries (see index_analyzer)
+def lookup_singleQ(index: Dict[str, List[int]], term: str, analyzer=None) -> List[int]:
+    start_time = time.perf_counter()
+    result = sorted(index.get(_normalize(term, analyzer or index_analyzer(index)), []))
+    end_time = time.perf_counter()
     elapsed_time = end_time - start_time
     return result, elapsed_time
 
 # Implements Figure 1.7 from the textbook
 # Returns the set of documents containing each term in the input list of terms
-def lookup_andQ(index: Dict[str, List[int]], *terms: str) -> List[int]:
+def lookup_andQ(index: Dict[str, List[int]], *terms: str, analyzer=None) -> List[int]:
     # dictionary: the naive inverted index
     # *terms: a tuple collecting all arguments after dictionary <t1,...,tn>
+    # analyzer: the analyzer that built the index, by default the one it carries (see index_analyzer)
     if not terms: 
         return [], 0.0
-    start_time = time.time()
+    start_time = time.perf_counter()
+    analyzer = analyzer or index_analyzer(index)
     # Retrieves postings lists for all terms in *terms
     term_postings = []
     for t in terms:
-        postings_list = sorted(index.get(_normalize(t), []))
+        postings_list = sorted(index.get(_normalize(t, analyzer), []))
         # Handles scenario where one or more terms have no postings
         if not postings_list:
-            return []
+            return [], time.perf_counter() - start_time
         term_postings.append(postings_list)
     # Sorts shortest postings first for efficiency
     term_postings.sort(key=len) 
@@ -56,14 +127,40 @@ def lookup_andQ(index: Dict[str, List[int]], *terms: str) -> List[int]:
         # Handles scenario where intersection is already empty
         if not intersect_result:
             break
-        intersect_result = intersect_postings(intersect_result, next_postings)
-    end_time = time.time()
+        # Intermediate results only shrink, so the ratio is re-evaluated for every list
+        intersect = choose_intersection(intersect_result, next_postings)
+        intersect_result = intersect(intersect_result, next_postings)
+    end_time = time.perf_counter()
     elapsed_time = end_time - start_time
     return intersect_result, elapsed_time
 
 
-from naive_indexer import inverted_index
+# Benchmarks the three intersection algorithms on skewed-frequency term pairs (one rare, one frequent term)
+# and checks that they agree
+def compare_intersections(index, num_pairs=5, repetitions=200):
+    by_df = sorted(index, key=lambda term: len(index[term]))
+    rare = [term for term in by_df if 2 <= len(index[term]) <= 20][:num_pairs]
+    frequent = by_df[-num_pairs:]
+    algorithms = [intersect_postings, intersect_with_skips, intersect_galloping]
+
+    print(f"{'pair':30} {'df':>14} " + " ".join(f"{a.__name__:>22}" for a in algorithms))
+    for rare_term, frequent_term in zip(rare, reversed(frequent)):
+        p1, p2 = list(index[rare_term]), list(index[frequent_term])
+        timings = []
+        results = []
+        for algorithm in algorithms:
+            start_time = time.perf_counter()
+            for _ in range(repetitions):
+                result = algorithm(p1, p2)
+            timings.append((time.perf_counter() - start_time) / repetitions)
+            results.append(result)
+        if any(result != results[0] for result in results):
+            raise AssertionError(f"intersection algorithms disagree on {rare_term!r} AND {frequent_term!r}")
+        print(f"{rare_term + ' AND ' + frequent_term:30} {f'{len(p1)}/{len(p2)}':>14} "
+              + " ".join(f"{t * 1e6:10.1f}us ({timings[0] / t:5.1f}x)" for t in timings))
+
 if __name__ == "__main__":
+    from naive_indexer import inverted_index
     # Single Term test queries
     print("Searching up 'lawsuit':", lookup_singleQ(inverted_index,"lawsuit")) 
     print("Seaching up 'bankruptcy':", lookup_singleQ(inverted_index,"bankruptcy"))
@@ -72,4 +169,8 @@ if __name__ == "__main__":
     # Multiple Term test queries
     print("\nSearching up 'liberal' and 'conservative':", lookup_andQ(inverted_index, "liberal", "conservative")) 
     print("\nSeaching up 'supreme' and 'court':", lookup_andQ(inverted_index, "supreme", "court"))
-    print("\nSeaching up 'cold' and 'war':",lookup_andQ(inverted_index, "cold", "war"))
\ No newline at end of file
+    print("\nSeaching up 'cold' and 'war':",lookup_andQ(inverted_index, "cold", "war"))
+
+    # Intersection algorithms on skewed-frequency pairs
+    print()
+    compare_intersections(inverted_index)
\ No newline at end of file
@@ -0,0 +1,309 @@
+import json, time, random, asyncio, argparse
+from concurrent.futures import ThreadPoolExecutor
+from query_processor import lookup_singleQ, lookup_andQ
+from boolean_query import lookup_booleanQ, QuerySyntaxError
+
+HOST = '127.0.0.1'
+PORT = 4790
+# Requests evaluated at the same time across all connections; further requests wait for a slot
+MAX_IN_FLIGHT = 64
+# Requests read ahead on one connection before the server stops reading from it
+PIPELINE_DEPTH = 16
+EVALUATION_WORKERS = 4
+# Upper bounds (in microseconds) of the latency histogram buckets, powers of two
+HISTOGRAM_BUCKETS = [2 ** i for i in range(24)]
+# Longest response line a client accepts (a frequent term has tens of thousands of docIDs)
+CLIENT_LINE_LIMIT = 1 << 24
+# Longest request line the server accepts, longer ones are discarded and answered with an ERR line
+REQUEST_LINE_LIMIT = 1 << 16
+
+# =====================================
+# LINE PROTOCOL (one request per line)
+# =====================================
+#   TERM <term>            lookup_singleQ
+#   AND <term> <term> ...  lookup_andQ
+#   BOOL <query>           lookup_booleanQ, eg: BOOL (supreme OR federal) AND court
+#   STATS                  server statistics as one JSON object
+# Every request gets exactly one response line, in request order:
+#   OK <count> <docID> <docID> ...     or     ERR <message>
+# (a request that fails in any way, including a line longer than REQUEST_LINE_LIMIT, gets an ERR line)
+# Clients may pipeline: send many requests without waiting, responses come back in the same order.
+
+
+# Request counters and a latency histogram (log2 buckets in microseconds)
+class ServerStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.started = time.perf_counter()
+
+    def record(self, latency_us):
+        self.requests += 1
+        bucket = 0
+        while bucket < len(HISTOGRAM_BUCKETS) and latency_us > HISTOGRAM_BUCKETS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+
+    # Upper bound (in microseconds) of the bucket holding the given fraction of requests
+    def percentile(self, fraction):
+        target = fraction * self.requests
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return HISTOGRAM_BUCKETS[bucket] if bucket < len(HISTOGRAM_BUCKETS) else float('inf')
+        return 0
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'connections': self.connections,
+            'uptime_seconds': time.perf_counter() - self.started,
+            'p50_us': self.percentile(0.50),
+            'p99_us': self.percentile(0.99),
+            'histogram_us': {f'<={bound}': count
+                             for bound, count in zip(HISTOGRAM_BUCKETS, self.histogram) if count},
+        }
+
+
+# Answers one request line, runs on the evaluation thread pool
+def evaluate_request(index, line):
+    command, _, argument = line.strip().partition(' ')
+    command = command.upper()
+    terms = argument.split()
+    if command == 'TERM' and len(terms) == 1:
+        result, _ = lookup_singleQ(index, terms[0])
+    elif command == 'AND' and terms:
+        result, _ = lookup_andQ(index, *terms)
+    elif command == 'BOOL' and terms:
+        try:
+            result, _ = lookup_booleanQ(index, argument)
+        except QuerySyntaxError as error:
+            return f"ERR {error}"
+    else:
+        return f"ERR unknown request {line.strip()!r}"
+    return f"OK {len(result)} " + ' '.join(map(str, result)) if result else "OK 0"
+
+
+# Long-lived query service over one loaded index
+# Backpressure: a connection reads at most PIPELINE_DEPTH requests ahead of its responses and every
+# request waits for one of MAX_IN_FLIGHT evaluation slots; while it waits the server stops reading from
+# that socket, so overloaded clients are slowed down by TCP flow control instead of queueing without bound
+class QueryServer:
+    def __init__(self, index, max_in_flight=MAX_IN_FLIGHT, pipeline_depth=PIPELINE_DEPTH,
+                 workers=EVALUATION_WORKERS):
+        self.index = index
+        self.pipeline_depth = pipeline_depth
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.stats = ServerStats()
+
+    async def _evaluate(self, line):
+        async with self.slots:
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+            start = time.perf_counter_ns()
+            try:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, evaluate_request, self.index, line)
+            except Exception as error:
+                # Whatever fails, the request still gets its one response line
+                response = ' '.join(f"ERR {type(error).__name__}: {error}".split())
+            finally:
+                self.stats.in_flight -= 1
+            self.stats.record((time.perf_counter_ns() - start) / 1000)
+            if response.startswith('ERR'):
+                self.stats.errors += 1
+            return response
+
+    # Writes the responses in request order; once the client is gone it keeps draining the queue,
+    # so the reading side never blocks on a full queue
+    async def _write_responses(self, pending, writer):
+        connected = True
+        while True:
+            task = await pending.get()
+            if task is None:
+                break
+            response = await task
+            if not connected:
+                continue
+            try:
+                writer.write(response.encode('utf-8') + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+
+    # Reads one request line: b'' at the end of the stream, None for a line longer than the reader's limit,
+    # which is discarded up to and including its newline
+    async def _read_request(self, reader):
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as error:
+            return error.partial
+        except asyncio.LimitOverrunError as error:
+            await reader.readexactly(error.consumed)
+        while True:
+            try:
+                await reader.readuntil(b'\n')
+                return None
+            except asyncio.IncompleteReadError:
+                return None
+            except asyncio.LimitOverrunError as error:
+                await reader.readexactly(error.consumed)
+
+    async def handle_connection(self, reader, writer):
+        self.stats.connections += 1
+        pending = asyncio.Queue(maxsize=self.pipeline_depth)
+        responder = asyncio.create_task(self._write_responses(pending, writer))
+        try:
+            while True:
+                line = await self._read_request(reader)
+                if line is None:
+                    self.stats.errors += 1
+                    task = asyncio.get_running_loop().create_future()
+                    task.set_result(f"ERR request longer than {REQUEST_LINE_LIMIT} bytes")
+                    await pending.put(task)
+                    continue
+                if not line:
+                    break
+                line = line.decode('utf-8', errors='replace')
+                if line.strip().upper() == 'STATS':
+                    task = asyncio.get_running_loop().create_future()
+                    task.set_result(json.dumps(self.stats.snapshot()))
+                else:
+                    task = asyncio.create_task(self._evaluate(line))
+                # Blocks once pipeline_depth responses are outstanding: stop reading, let TCP push back
+                await pending.put(task)
+            await pending.put(None)
+            await responder
+        except ConnectionError:
+            responder.cancel()
+        finally:
+            self.stats.connections -= 1
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=REQUEST_LINE_LIMIT)
+        print(f"DEBUG: query server listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+# =====================================
+# LOAD GENERATOR
+# =====================================
+
+# One client connection keeping "depth" pipelined requests outstanding until the deadline
+async def _client(host, port, requests, depth, deadline, latencies):
+    reader, writer = await asyncio.open_connection(host, port, limit=CLIENT_LINE_LIMIT)
+    sent_at = []
+    completed = 0
+    next_request = 0
+
+    def send_one():
+        nonlocal next_request
+        writer.write(requests[next_request % len(requests)].encode('utf-8') + b'\n')
+        sent_at.append(time.perf_counter_ns())
+        next_request += 1
+
+    for _ in range(depth):
+        send_one()
+    await writer.drain()
+    while completed < len(sent_at):
+        line = await reader.readline()
+        if not line:
+            break
+        latencies.append(time.perf_counter_ns() - sent_at[completed])
+        completed += 1
+        if time.perf_counter() < deadline:
+            send_one()
+            await writer.drain()
+    writer.close()
+    return completed
+
+# Drives the server with "connections" clients for "duration" seconds and reports the sustained QPS
+# and the latency seen by the clients (queueing included)
+async def run_load(requests, host=HOST, port=PORT, connections=8, depth=PIPELINE_DEPTH, duration=10.0):
+    latencies = []
+    start_time = time.perf_counter()
+    deadline = start_time + duration
+    counts = await asyncio.gather(*(_client(host, port, requests, depth, deadline, latencies)
+                                    for _ in range(connections)))
+    elapsed_time = time.perf_counter() - start_time
+    latencies.sort()
+    report = {
+        'requests': sum(counts),
+        'seconds': elapsed_time,
+        'qps': sum(counts) / elapsed_time,
+        'p50_us': latencies[len(latencies) // 2] / 1000 if latencies else 0.0,
+        'p99_us': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] / 1000 if latencies else 0.0,
+    }
+    print(f"DEBUG: {connections} connections x {depth} pipelined requests: {report['requests']:,} requests in "
+          f"{elapsed_time:.2f} seconds = {report['qps']:,.0f} queries/sec, "
+          f"client latency p50 {report['p50_us']:.0f}us, p99 {report['p99_us']:.0f}us")
+    return report
+
+# Fetches the server statistics over the protocol
+async def fetch_stats(host=HOST, port=PORT):
+    reader, writer = await asyncio.open_connection(host, port, limit=CLIENT_LINE_LIMIT)
+    writer.write(b'STATS\n')
+    await writer.drain()
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+# Mix of single term, AND and Boolean requests over random index terms
+def make_requests(index, count=1000, seed=479):
+    rng = random.Random(seed)
+    terms = sorted(index.keys())
+    requests = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            requests.append(f"TERM {rng.choice(terms)}")
+        elif kind < 0.8:
+            requests.append(f"AND {rng.choice(terms)} {rng.choice(terms)}")
+        else:
+            requests.append(f"BOOL ({rng.choice(terms)} OR {rng.choice(terms)}) AND NOT {rng.choice(terms)}")
+    return requests
+
+# python query_server.py serve             loads the index once and serves it
+# python query_server.py bench [--duration] runs the load generator against a running server
+# python query_server.py selftest          serves the index in-process and benchmarks it on localhost
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asyncio line-protocol query server")
+    parser.add_argument('mode', choices=('serve', 'bench', 'selftest'))
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=PIPELINE_DEPTH)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    from naive_indexer import load_inverted_index
+    index = load_inverted_index()
+    if args.mode == 'serve':
+        asyncio.run(QueryServer(index).serve(args.host, args.port))
+    elif args.mode == 'bench':
+        asyncio.run(run_load(make_requests(index), args.host, args.port, args.connections, args.depth, args.duration))
+        print(json.dumps(asyncio.run(fetch_stats(args.host, args.port)), indent=2))
+    else:
+        async def selftest():
+            server = QueryServer(index)
+            listener = await asyncio.start_server(server.handle_connection, args.host, args.port,
+                                                  limit=REQUEST_LINE_LIMIT)
+            async with listener:
+                await run_load(make_requests(index), args.host, args.port, args.connections, args.depth,
+                               args.duration)
+                # Lets the server notice the clients hanging up before the listener shuts down
+                while server.stats.connections:
+                    await asyncio.sleep(0.01)
+            print(json.dumps(server.stats.snapshot(), indent=2))
+        asyncio.run(selftest())
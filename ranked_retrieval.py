@@ -0,0 +1,260 @@
+import math, time, heapq
+from bisect import bisect_left
+from query_processor import _normalize, index_analyzer
+
+# BM25 parameters (Section 11.4.3)
+K1 = 1.2
+B = 0.75
+
+
+# Term statistics needed for BM25: postings with term frequencies, document lengths and collection size
+# Built from a {term: [(docID, tf), ...]} index (naive_indexer.build_tf_index,
+# build_spimi_inspired(record_tf=True)) or from an index file written with term frequencies (build_spimi_disk)
+# The score upper bound of every term (its max score: the largest score it contributes to any document,
+# which WAND and MaxScore prune with) is computed once when the index is built, so no query and no load
+# ever has to score a full postings list to find it: an index file stores it per term (merge_blocks,
+# index_store.write_index), an in-memory index computes it in from_tf_index.
+# Postings are not cached: they are fetched per query.
+class RankedIndex:
+    # upper_bound: term -> max score of an indexed term
+    def __init__(self, get_with_tf, doc_lengths, upper_bound=None, k1=K1, b=B):
+        self.get_with_tf = get_with_tf
+        self.doc_lengths = doc_lengths
+        self.num_docs = len(doc_lengths)
+        self.avg_length = sum(doc_lengths.values()) / self.num_docs if self.num_docs else 0.0
+        self.k1 = k1
+        self.b = b
+        self.upper_bound = upper_bound
+
+    @classmethod
+    def from_tf_index(cls, tf_index, **params):
+        doc_lengths = {}
+        for postings in tf_index.values():
+            for docid, tf in postings:
+                doc_lengths[docid] = doc_lengths.get(docid, 0) + tf
+
+        def get_with_tf(term):
+            postings = tf_index.get(term, ())
+            return [docid for docid, _ in postings], [tf for _, tf in postings]
+        index = cls(get_with_tf, doc_lengths, **params)
+        max_scores = {term: index.max_score(*get_with_tf(term)) for term in tf_index}
+        index.upper_bound = max_scores.get
+        return index
+
+    # Index file written with term frequencies and max scores (build_spimi_disk, index_store.write_index)
+    # Opening it reads no postings: the max scores are looked up in the file along with each query term
+    @classmethod
+    def from_disk(cls, disk_index, **params):
+        k1, b = disk_index.score_params()
+        if (params.get('k1', k1), params.get('b', b)) != (k1, b):
+            raise ValueError(f"{disk_index.path} stores max scores for k1={k1}, b={b}, "
+                             f"rebuild it for other parameters")
+        return cls(disk_index.get_with_tf, disk_index.document_lengths(), disk_index.max_score, k1=k1, b=b)
+
+    # Okapi BM25 idf in its log(1 + ...) form: always positive, so even a term found in more than half
+    # of the documents adds to a score instead of lowering it
+    def idf(self, df):
+        return math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def term_score(self, idf, tf, docid):
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docid] / self.avg_length)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    # Largest score a term with these postings contributes to any document
+    def max_score(self, docids, tfs):
+        idf = self.idf(len(docids))
+        return max((self.term_score(idf, tf, docid) for docid, tf in zip(docids, tfs)), default=0.0)
+
+    # Returns (docIDs, tfs, idf, upper bound) of a normalized term
+    def term(self, term):
+        docids, tfs = self.get_with_tf(term)
+        upper_bound = self.upper_bound(term) if docids else 0.0
+        return docids, tfs, self.idf(len(docids)), upper_bound
+
+
+# Walks one postings list during top-k evaluation
+class _Cursor:
+    __slots__ = ('docids', 'tfs', 'idf', 'upper_bound', 'pos')
+
+    def __init__(self, docids, tfs, idf, upper_bound):
+        self.docids = docids
+        self.tfs = tfs
+        self.idf = idf
+        self.upper_bound = upper_bound
+        self.pos = 0
+
+    def current(self):
+        return self.docids[self.pos] if self.pos < len(self.docids) else None
+
+    # Moves to the first posting >= docid
+    def seek(self, docid):
+        self.pos = bisect_left(self.docids, docid, self.pos)
+
+
+# Keeps the k best (score, docID) pairs, threshold() is the score a document must beat to get in
+class _TopK:
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+
+    def threshold(self):
+        return self.heap[0][0] if len(self.heap) >= self.k else 0.0
+
+    def push(self, score, docid):
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (score, -docid))
+        elif score > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (score, -docid))
+
+    def results(self):
+        return [(-negative_docid, score) for score, negative_docid in sorted(self.heap, reverse=True)]
+
+
+# Term-at-a-time scoring of every posting, the reference the pruning strategies are checked against
+def _exhaustive(index, cursors, k, stats):
+    scores = {}
+    for cursor in cursors:
+        for docid, tf in zip(cursor.docids, cursor.tfs):
+            scores[docid] = scores.get(docid, 0.0) + index.term_score(cursor.idf, tf, docid)
+        stats['scored'] += len(cursor.docids)
+    top = _TopK(k)
+    for docid, score in scores.items():
+        top.push(score, docid)
+    return top.results()
+
+# WAND (Broder et al.): cursors are kept sorted by current docID, the pivot is the first cursor at which
+# the summed upper bounds exceed the threshold. Documents before the pivot docID cannot make the top k,
+# so the cursors in front of it jump straight to it without scoring anything.
+def _wand(index, cursors, k, stats):
+    top = _TopK(k)
+    active = [cursor for cursor in cursors if cursor.current() is not None]
+    while active:
+        active.sort(key=_Cursor.current)
+        threshold = top.threshold()
+        bound = 0.0
+        pivot = None
+        for i, cursor in enumerate(active):
+            bound += cursor.upper_bound
+            if bound > threshold:
+                pivot = i
+                break
+        if pivot is None:
+            break
+        pivot_docid = active[pivot].current()
+        if active[0].current() == pivot_docid:
+            # Every cursor up to the pivot is on pivot_docid: score it fully
+            score = 0.0
+            for cursor in active:
+                if cursor.current() != pivot_docid:
+                    break
+                score += index.term_score(cursor.idf, cursor.tfs[cursor.pos], pivot_docid)
+                stats['scored'] += 1
+                cursor.pos += 1
+            top.push(score, pivot_docid)
+        else:
+            for cursor in active[:pivot]:
+                cursor.seek(pivot_docid)
+        active = [cursor for cursor in active if cursor.current() is not None]
+    return top.results()
+
+# MaxScore (Turtle & Flood): terms are ordered by upper bound, the ones whose summed bounds cannot beat
+# the threshold are "non-essential". Candidates come only from the essential lists, and the non-essential
+# lists are probed (by binary search) only while the candidate can still make the top k.
+def _maxscore(index, cursors, k, stats):
+    top = _TopK(k)
+    cursors = sorted(cursors, key=lambda cursor: cursor.upper_bound)
+    prefix_bounds = []
+    total = 0.0
+    for cursor in cursors:
+        total += cursor.upper_bound
+        prefix_bounds.append(total)
+
+    while True:
+        threshold = top.threshold()
+        first_essential = 0
+        while first_essential < len(cursors) and prefix_bounds[first_essential] <= threshold:
+            first_essential += 1
+        essential = cursors[first_essential:]
+        candidates = [cursor.current() for cursor in essential if cursor.current() is not None]
+        if not candidates:
+            break
+        docid = min(candidates)
+
+        score = 0.0
+        for cursor in essential:
+            if cursor.current() == docid:
+                score += index.term_score(cursor.idf, cursor.tfs[cursor.pos], docid)
+                stats['scored'] += 1
+                cursor.pos += 1
+        remaining = prefix_bounds[first_essential - 1] if first_essential else 0.0
+        for i in range(first_essential - 1, -1, -1):
+            if score + remaining <= threshold:
+                break
+            cursor = cursors[i]
+            cursor.seek(docid)
+            if cursor.current() == docid:
+                score += index.term_score(cursor.idf, cursor.tfs[cursor.pos], docid)
+                stats['scored'] += 1
+            remaining -= cursor.upper_bound
+        top.push(score, docid)
+    return top.results()
+
+TOPK_METHODS = {'exhaustive': _exhaustive, 'wand': _wand, 'maxscore': _maxscore}
+
+
+# Ranked free-text retrieval: returns the k best (docID, BM25 score) pairs, best first
+# stats, if given, receives the number of postings scored and the total number of postings involved
+def search_topk(index, query, k=10, method='wand', stats=None):
+    start_time = time.perf_counter()
+    if method not in TOPK_METHODS:
+        raise ValueError(f"unknown top-k method {method!r}, expected one of {sorted(TOPK_METHODS)}")
+    analyzer = index_analyzer(index)
+    terms = {_normalize(word, analyzer) for word in query.split()}
+    cursors = []
+    for term in sorted(terms):
+        docids, tfs, idf, upper_bound = index.term(term)
+        if docids:
+            cursors.append(_Cursor(docids, tfs, idf, upper_bound))
+    counters = {'scored': 0, 'postings': sum(len(cursor.docids) for cursor in cursors)}
+    result = TOPK_METHODS[method](index, cursors, k, counters) if cursors else []
+    if stats is not None:
+        stats.update(counters)
+    elapsed_time = time.perf_counter() - start_time
+    return result, elapsed_time
+
+
+# Compares the pruning strategies with exhaustive scoring: identical top-k scores,
+# mean latency and the share of postings that actually had to be scored
+def compare_topk(index, queries, k=10, repetitions=20):
+    print("="*70)
+    print(f"TOP-{k} BM25 RETRIEVAL: EXHAUSTIVE VS WAND VS MAXSCORE")
+    print("="*70)
+    for method in TOPK_METHODS:
+        cold = elapsed = 0.0
+        scored = postings = 0
+        for query in queries:
+            # First run of the query, before anything else touched its terms
+            stats = {}
+            start_time = time.perf_counter()
+            result, _ = search_topk(index, query, k, method, stats)
+            cold += time.perf_counter() - start_time
+            reference, _ = search_topk(index, query, k, 'exhaustive')
+            if [round(score, 9) for _, score in result] != [round(score, 9) for _, score in reference]:
+                raise AssertionError(f"{method} disagrees with exhaustive scoring on {query!r}")
+            start_time = time.perf_counter()
+            for _ in range(repetitions):
+                search_topk(index, query, k, method)
+            elapsed += (time.perf_counter() - start_time) / repetitions
+            scored += stats['scored']
+            postings += stats['postings']
+        print(f"{method:12} cold {cold / len(queries) * 1000:8.3f} ms   mean latency "
+              f"{elapsed / len(queries) * 1000:8.3f} ms   "
+              f"postings scored {scored:,} of {postings:,} ({scored / max(postings, 1):.1%})")
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import REUTERS_DIR, process_documents, build_tf_index
+    ranked_index = RankedIndex.from_tf_index(build_tf_index(process_documents(REUTERS_DIR)))
+    print(search_topk(ranked_index, "supreme court ruling"))
+    compare_topk(ranked_index, ["supreme court ruling", "cold war", "copper prices chile",
+                                "bundesbank interest rates", "chrysler american motors takeover"])
@@ -0,0 +1,136 @@
+import os, sys, json, time, argparse, subprocess, tempfile
+try:
+    import resource  # not available on Windows, peak RSS is then not reported
+except ImportError:
+    resource = None
+
+from synthetic_corpus import REUTERS_DOCS, generate_corpus
+
+BUILDERS = ('naive', 'spimi-memory', 'spimi-disk')
+SCALES = (1, 10, 100)
+
+
+# Peak resident set size of the current process in bytes (ru_maxrss is in KB on Linux, bytes on macOS)
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+# Bytes the current process has passed to write() so far (Linux only)
+def bytes_written():
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+# Runs inside a fresh process, so peak RSS and bytes written belong to this build only
+# Every builder ends with the same binary index file, the in-memory ones through index_store.write_index
+def run_builder(builder, corpus_dir, work_dir):
+    from index_store import write_index
+    output_file = os.path.join(work_dir, f'{builder}.bin')
+    written_before = bytes_written()
+    start_time = time.perf_counter()
+    if builder == 'naive':
+        from naive_indexer import build_naive_index
+        write_index(build_naive_index(corpus_dir), output_file)
+    elif builder == 'spimi-memory':
+        from spimi_index import build_spimi_inspired
+        write_index(build_spimi_inspired(corpus_dir)[0], output_file)
+    elif builder == 'spimi-disk':
+        from spimi_index import build_spimi_disk
+        build_spimi_disk(corpus_dir, output_file, block_dir=work_dir)
+    else:
+        raise ValueError(f"unknown builder {builder!r}, expected one of {BUILDERS}")
+    elapsed_time = time.perf_counter() - start_time
+    written_after = bytes_written()
+    return {
+        'seconds': elapsed_time,
+        'peak_rss': peak_rss(),
+        'bytes_written': written_after - written_before if written_before is not None else None,
+        'index_bytes': os.path.getsize(output_file),
+    }
+
+# Runs one build in a subprocess and returns its measurements, or None if it failed (eg: out of memory)
+def measure_build(builder, corpus_dir, work_dir, timeout=None):
+    result_file = os.path.join(work_dir, f'{builder}.json')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', builder, corpus_dir, work_dir, result_file]
+    try:
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print(f"DEBUG: {builder} timed out after {timeout} seconds")
+        return None
+    if completed.returncode != 0:
+        error = completed.stderr.decode(errors='replace').strip().splitlines()
+        print(f"DEBUG: {builder} failed with exit code {completed.returncode}: {error[-1] if error else ''}")
+        return None
+    with open(result_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Generates a synthetic corpus at every scale (multiples of the Reuters-21578 size)
+# and measures every builder on it: docs/sec, peak RSS, bytes written and final index size
+def run_scaling_suite(scales=SCALES, builders=BUILDERS, base_docs=REUTERS_DOCS, work_dir=None, timeout=None):
+    results = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        for scale in scales:
+            num_docs = scale * base_docs
+            corpus_dir = os.path.join(tmp_dir, f'corpus_{scale}x')
+            _, corpus_bytes = generate_corpus(corpus_dir, num_docs)
+            for builder in builders:
+                build_dir = os.path.join(tmp_dir, f'{builder}_{scale}x')
+                os.makedirs(build_dir)
+                print(f"DEBUG: running {builder} at {scale}x ({num_docs:,} documents)...")
+                measured = measure_build(builder, corpus_dir, build_dir, timeout)
+                row = {'builder': builder, 'scale': scale, 'docs': num_docs, 'corpus_bytes': corpus_bytes}
+                if measured:
+                    row.update(measured)
+                    row['docs_per_second'] = num_docs / measured['seconds']
+                results.append(row)
+    return results
+
+def _megabytes(value):
+    return f"{value / 2**20:10.1f}" if value is not None else f"{'-':>10}"
+
+def print_scaling_suite(results):
+    print("="*92)
+    print("INDEXING THROUGHPUT AT SCALE")
+    print("="*92)
+    print(f"{'builder':14} {'scale':>6} {'docs':>11} {'seconds':>10} {'docs/sec':>10} "
+          f"{'peak RSS MB':>12} {'written MB':>11} {'index MB':>10}")
+    for row in results:
+        if 'seconds' not in row:
+            print(f"{row['builder']:14} {row['scale']:>5}x {row['docs']:>11,} {'failed':>10}")
+            continue
+        print(f"{row['builder']:14} {row['scale']:>5}x {row['docs']:>11,} {row['seconds']:10.2f} "
+              f"{row['docs_per_second']:10,.0f} {_megabytes(row['peak_rss']):>12} "
+              f"{_megabytes(row['bytes_written']):>11} {_megabytes(row['index_bytes'])}")
+    print("="*92)
+
+# Testing: python scaling_benchmark.py [--scales 1 10 100] [--base-docs N] [--output results.json]
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        builder, corpus_dir, work_dir, result_file = sys.argv[2:6]
+        measured = run_builder(builder, corpus_dir, work_dir)
+        with open(result_file, 'w', encoding='utf-8') as f:
+            json.dump(measured, f)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Indexing throughput scaling suite")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES))
+    parser.add_argument('--builders', nargs='+', default=list(BUILDERS), choices=BUILDERS)
+    parser.add_argument('--base-docs', type=int, default=REUTERS_DOCS, help="documents at 1x")
+    parser.add_argument('--work-dir', help="where corpora and indexes are written (default: system temp)")
+    parser.add_argument('--timeout', type=float, help="seconds allowed per build")
+    parser.add_argument('--output', help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = run_scaling_suite(args.scales, args.builders, args.base_docs, args.work_dir, args.timeout)
+    print_scaling_suite(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
@@ -1,50 +1,295 @@
-# python -m pip install requests
-# python -m pip install beautifulsoup4
-
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
-from urllib.robotparser import RobotFileParser
-
-URL = "https://store.steampowered.com/"
-permitted_domains = ["store.steampowered.com", "google.com", "youtube.com"]
-upper_bound = 500
-
-# Check robots.txt
-rp = RobotFileParser()
-rp.set_url(urljoin(URL,"/robots.txt")) #locates robots.txt
-rp.read()
-
-page = requests.get(URL) #downloads the page content
-soup = BeautifulSoup(page.content, 'html.parser')
-results = soup.find_all("a", href=True) #extracts all URLs
-
-print("Starting program...")
-count = 0    #monitors number of valid URLs found
-seen = set() #monitors already-visited URLs to avoid duplicates
-
-for link in results:
-    # Terminates if the upper bound is reached
-    if count >= upper_bound:
-        break
-    href = link.get("href")
-    full_url = urljoin(URL, href) #normalize into functional URL
-
-    # Skips duplicate URLs
-    if full_url in seen:
-        continue
-    seen.add(full_url) #marks the URL as seen
-    domain = urlparse(full_url).netloc #extracts domain name
-
-    # Skips if domain is not permitted
-    if domain not in permitted_domains:
-        continue
-
-    # Skips if the standard for robot exclusion is violated
-    if not rp.can_fetch("*", full_url):
-        print("NOTICE: URL skipped, Robot Exclusion Standard violated.")
-        continue
-
-    print(f"Found URL: {full_url}")
-    count += 1
-
+# python -m pip install aiohttp
+# python -m pip install beautifulsoup4
+
+import os, sys, json, time, math, base64, random, asyncio, hashlib, posixpath, threading
+from collections import deque
+from urllib.parse import urlparse, urlunparse, urljoin
+from urllib.robotparser import RobotFileParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+URL = "https://store.steampowered.com/"
+permitted_domains = ["store.steampowered.com", "google.com", "youtube.com"]
+upper_bound = 500
+
+USER_AGENT = "479-crawler"
+# Open connections in the shared keep-alive pool, in total and towards a single host
+MAX_CONNECTIONS = 64
+PER_HOST_LIMIT = 2
+# Seconds between two requests to the same host, unless robots.txt asks for more
+CRAWL_DELAY = 1.0
+FETCH_TIMEOUT = 10
+WORKERS = 32
+FRONTIER_FILE = 'crawl_frontier.json'
+# Pages crawled between two saves of the frontier
+SAVE_EVERY = 50
+# Sizing of the seen-URL Bloom filter
+BLOOM_CAPACITY = 1000000
+BLOOM_ERROR_RATE = 0.001
+
+
+# Canonical form of a URL, or None for anything that is not http(s)
+# Lowercases scheme and host, drops default ports and fragments, resolves "." and ".." segments
+def normalize_url(url):
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    if scheme not in ('http', 'https') or not parsed.hostname:
+        return None
+    netloc = parsed.hostname.lower()
+    if parsed.port and parsed.port != {'http': 80, 'https': 443}[scheme]:
+        netloc += f':{parsed.port}'
+    path = parsed.path or '/'
+    if '.' in path:
+        resolved = posixpath.normpath(path)
+        path = resolved + '/' if path.endswith('/') and resolved != '/' else resolved
+    return urlunparse((scheme, netloc, path, parsed.params, parsed.query, ''))
+
+
+# Compact seen-set: k bit positions per URL (double hashing), false positives at the configured rate
+# A false positive only means a page is skipped, which is acceptable for a crawler's duplicate check
+class BloomFilter:
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE, bits=None):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+# robots.txt of every host, fetched once through the crawler's session
+class RobotsCache:
+    def __init__(self, session):
+        self.session = session
+        self.parsers = {}
+        self.locks = {}
+
+    async def get(self, url):
+        parsed = urlparse(url)
+        host = f'{parsed.scheme}://{parsed.netloc}'
+        if host in self.parsers:
+            return self.parsers[host]
+        lock = self.locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            if host not in self.parsers:
+                rp = RobotFileParser(host + '/robots.txt')
+                try:
+                    async with self.session.get(host + '/robots.txt') as response:
+                        if response.status in (401, 403):
+                            rp.disallow_all = True
+                        elif response.status >= 400:
+                            rp.allow_all = True
+                        else:
+                            rp.parse((await response.text(errors='replace')).splitlines())
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    rp.allow_all = True
+                self.parsers[host] = rp
+        return self.parsers[host]
+
+    async def can_fetch(self, url):
+        return (await self.get(url)).can_fetch(USER_AGENT, url)
+
+    async def crawl_delay(self, url, default):
+        delay = (await self.get(url)).crawl_delay(USER_AGENT)
+        return max(float(delay), default) if delay is not None else default
+
+
+# Politeness towards one host: at most "limit" concurrent requests, "delay" seconds between request starts
+class HostPolicy:
+    def __init__(self, limit):
+        self.slots = asyncio.Semaphore(limit)
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+
+    async def wait_turn(self, delay):
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_start > now:
+                await asyncio.sleep(self.next_start - now)
+            self.next_start = max(now, self.next_start) + delay
+
+
+# Breadth-first crawler: worker tasks share one pooled aiohttp session, a frontier of URLs still to fetch
+# and a Bloom filter of every URL ever queued. The frontier and the filter are saved to frontier_file
+# every SAVE_EVERY pages, and a crawl started with the same file resumes where the previous one stopped.
+class Crawler:
+    def __init__(self, seeds, permitted_domains=permitted_domains, upper_bound=upper_bound,
+                 frontier_file=FRONTIER_FILE, per_host_limit=PER_HOST_LIMIT, crawl_delay=CRAWL_DELAY,
+                 workers=WORKERS, verbose=True):
+        self.permitted_domains = set(permitted_domains)
+        self.upper_bound = upper_bound
+        self.frontier_file = frontier_file
+        self.per_host_limit = per_host_limit
+        self.crawl_delay = crawl_delay
+        self.workers = workers
+        self.verbose = verbose
+        self.hosts = {}
+        self.in_progress = set()
+        self.count = 0
+        self.errors = 0
+        if frontier_file and os.path.exists(frontier_file):
+            self._load()
+            print(f"DEBUG: resuming crawl with {len(self.frontier)} queued URLs, {self.count} pages already crawled")
+        else:
+            self.frontier = deque()
+            self.seen = BloomFilter()
+            for seed in seeds:
+                self._enqueue(normalize_url(seed))
+
+    def _enqueue(self, url):
+        if url is None or url in self.seen:
+            return
+        if urlparse(url).netloc not in self.permitted_domains:
+            return
+        self.seen.add(url)
+        self.frontier.append(url)
+
+    def _load(self):
+        with open(self.frontier_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.frontier = deque(state['frontier'])
+        self.count = state['count']
+        self.seen = BloomFilter(bits=bytearray(base64.b64decode(state['seen'])))
+
+    def save(self):
+        if not self.frontier_file:
+            return
+        # Pages being fetched go back to the front of the queue, so an interrupted crawl retries them
+        state = {'frontier': sorted(self.in_progress) + list(self.frontier), 'count': self.count,
+                 'seen': base64.b64encode(self.seen.bits).decode('ascii')}
+        with open(self.frontier_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(self.frontier_file + '.tmp', self.frontier_file)
+
+    async def _fetch(self, session, robots, url):
+        if not await robots.can_fetch(url):
+            if self.verbose:
+                print("NOTICE: URL skipped, Robot Exclusion Standard violated.")
+            return None
+        host = urlparse(url).netloc
+        policy = self.hosts.get(host)
+        if policy is None:
+            policy = self.hosts[host] = HostPolicy(self.per_host_limit)
+        async with policy.slots:
+            await policy.wait_turn(await robots.crawl_delay(url, self.crawl_delay))
+            async with session.get(url) as response:
+                if response.status != 200 or 'html' not in response.headers.get('Content-Type', ''):
+                    return None
+                return await response.text(errors='replace')
+
+    async def _worker(self, session, robots):
+        while self.count < self.upper_bound:
+            if not self.frontier:
+                if not self.in_progress:
+                    return
+                await asyncio.sleep(0.01)
+                continue
+            url = self.frontier.popleft()
+            self.in_progress.add(url)
+            try:
+                page = await self._fetch(session, robots, url)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.errors += 1
+                page = None
+            finally:
+                self.in_progress.discard(url)
+            if page is None or self.count >= self.upper_bound:
+                continue
+            self.count += 1
+            if self.verbose:
+                print(f"Found URL: {url}")
+            soup = BeautifulSoup(page, 'html.parser')
+            for link in soup.find_all("a", href=True): #extracts all URLs
+                self._enqueue(normalize_url(urljoin(url, link.get("href"))))
+            if self.count % SAVE_EVERY == 0:
+                self.save()
+
+    async def run(self):
+        start_time = time.perf_counter()
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=self.per_host_limit)
+        timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={'User-Agent': USER_AGENT}) as session:
+            robots = RobotsCache(session)
+            await asyncio.gather(*(self._worker(session, robots) for _ in range(self.workers)))
+        self.save()
+        elapsed_time = time.perf_counter() - start_time
+        print(f"DEBUG: crawled {self.count} pages in {elapsed_time:.2f} seconds "
+              f"({self.count / elapsed_time:.1f} pages/sec), {self.errors} errors, "
+              f"{len(self.frontier)} URLs left in the frontier")
+        return self.count, elapsed_time
+
+
+# ===================================
+# LOCAL BENCHMARK
+# ===================================
+
+# Serves a generated link graph over HTTP/1.1 keep-alive: /page/<n> links to out_degree random pages,
+# spread over several local "hosts" (one port each) so that per-host limits matter
+def serve_link_graph(num_pages, out_degree=8, num_hosts=4, crawl_delay=0, seed=479):
+    rng = random.Random(seed)
+    servers = [ThreadingHTTPServer(('127.0.0.1', 0), BaseHTTPRequestHandler) for _ in range(num_hosts)]
+    hosts = [f'127.0.0.1:{server.server_address[1]}' for server in servers]
+    links = [[rng.randrange(num_pages) for _ in range(out_degree)] for _ in range(num_pages)]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == '/robots.txt':
+                body = f"User-agent: *\nCrawl-delay: {crawl_delay}\nDisallow: /private/\n".encode()
+                content_type = 'text/plain'
+            elif self.path.startswith('/page/') and self.path[6:].isdigit() and int(self.path[6:]) < num_pages:
+                anchors = ''.join(f'<a href="http://{hosts[target % num_hosts]}/page/{target}">page {target}</a> '
+                                  for target in links[int(self.path[6:])])
+                body = f"<html><body><h1>{self.path}</h1>{anchors}<a href=\"/private/x\">x</a></body></html>".encode()
+                content_type = 'text/html'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    for server in servers:
+        server.RequestHandlerClass = Handler
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return servers, hosts
+
+# Crawls a local link graph and reports pages/sec
+def benchmark_crawler(num_pages=2000, out_degree=8, num_hosts=4, per_host_limit=8, crawl_delay=0.0):
+    servers, hosts = serve_link_graph(num_pages, out_degree, num_hosts)
+    try:
+        crawler = Crawler([f'http://{hosts[0]}/page/0'], hosts, upper_bound=num_pages, frontier_file=None,
+                          per_host_limit=per_host_limit, crawl_delay=crawl_delay, verbose=False)
+        pages, elapsed_time = asyncio.run(crawler.run())
+    finally:
+        for server in servers:
+            server.shutdown()
+    print(f"DEBUG: benchmark: {pages} pages from {num_hosts} hosts, {per_host_limit} connections per host, "
+          f"{pages / elapsed_time:.1f} pages/sec")
+    return pages / elapsed_time
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        benchmark_crawler()
+    else:
+        print("Starting program...")
+        asyncio.run(Crawler([URL]).run())
@@ -0,0 +1,137 @@
+#pip install beautifulsoup4 lxml   (only needed for the reference parser)
+
+import os, glob, re, time
+from html.entities import name2codepoint
+
+# Patterns for the handful of SGML elements the indexers actually use
+NEWID_PATTERN = re.compile(r'\bNEWID="(\d+)"')
+TEXT_PATTERN = re.compile(r'<TEXT\b[^>]*>(.*?)</TEXT>', re.DOTALL)
+TITLE_PATTERN = re.compile(r'<TITLE>(.*?)</TITLE>', re.DOTALL)
+DATELINE_PATTERN = re.compile(r'<DATELINE>(.*?)</DATELINE>', re.DOTALL)
+BODY_TAG_PATTERN = re.compile(r'</?BODY>')
+TAG_PATTERN = re.compile(r'<[^>]*>')
+ENTITY_PATTERN = re.compile(r'&(#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);')
+
+
+# Resolves character and entity references the way lxml does
+# Unlike html.unescape, control characters such as &#3; are kept as-is
+def _replace_entity(match):
+    ref = match.group(1)
+    if ref[0] == '#':
+        codepoint = int(ref[2:], 16) if ref[1] in 'xX' else int(ref[1:])
+        return chr(codepoint) if codepoint <= 0x10FFFF else match.group(0)
+    if ref in name2codepoint:
+        return chr(name2codepoint[ref])
+    return match.group(0)
+
+def _unescape(fragment):
+    if '&' not in fragment:
+        return fragment
+    return ENTITY_PATTERN.sub(_replace_entity, fragment)
+
+# Equivalent of BeautifulSoup's tag.get_text(" ", strip=True) on an SGML fragment
+# Every text node between two tags is stripped, empty ones are dropped, the rest are joined by spaces
+def _get_text(fragment):
+    pieces = (_unescape(piece).strip() for piece in TAG_PATTERN.split(fragment))
+    return " ".join(piece for piece in pieces if piece)
+
+# Rebuilds the (newid, text) record of a single <REUTERS> element
+# lxml's HTML parser discards the nested <BODY> tags, so parse_sgm_soup always takes its
+# fallback branch: title, dateline, then every text node of <TEXT>. This reproduces that output.
+def _extract_record(header, chunk):
+    newid = int(NEWID_PATTERN.search(header).group(1))
+    text_match = TEXT_PATTERN.search(chunk)
+    if not text_match:
+        return None
+    text = BODY_TAG_PATTERN.sub('', text_match.group(1))
+
+    components = []
+    title = TITLE_PATTERN.search(text)
+    if title:
+        components.append(_get_text(title.group(1)))
+    dateline = DATELINE_PATTERN.search(text)
+    if dateline:
+        components.append(_get_text(dateline.group(1)))
+    components.append(_get_text(text))
+    return newid, " ".join(components)
+
+# Streams the documents of a given .sgm file as (newid, text) records, one at a time
+# Only the lines of the current <REUTERS> element are ever held in memory
+def iter_sgm(filepath):
+    with open(filepath, 'r', encoding='latin-1', errors='ignore') as f:
+        header = None
+        lines = []
+        for line in f:
+            if header is None:
+                if line.startswith('<REUTERS'):
+                    header = line
+                    lines = [line]
+                continue
+            lines.append(line)
+            if '</REUTERS>' in line:
+                record = _extract_record(header, "".join(lines))
+                if record is not None:
+                    yield record
+                header = None
+                lines = []
+
+# Original BeautifulSoup/lxml parser, kept as the reference implementation for compare_parsers()
+def parse_sgm_soup(filepath):
+    from bs4 import BeautifulSoup
+    with open(filepath, 'r', encoding='latin-1', errors='ignore') as f:
+        soup = BeautifulSoup(f.read(), 'lxml')
+    documents = []
+    for reuters_tag in soup.find_all('reuters'):
+        newid = int(reuters_tag.get('newid'))
+        text_tag = reuters_tag.find('text')
+        if not text_tag:
+            continue
+
+        title = text_tag.find('title')
+        dateline = text_tag.find('dateline')
+        body = text_tag.find('body')
+
+        components = []
+        if title:
+            components.append(title.get_text(" ", strip=True))
+        if dateline:
+            components.append(dateline.get_text(" ", strip=True))
+        if body:
+            components.append(body.get_text(" ", strip=True))
+        else:
+            #Fallback option in case there's no body
+            components.append(text_tag.get_text(" ", strip=True))
+        raw_text = " ".join(components)
+        documents.append((newid, raw_text))
+    return documents
+
+
+# Benchmarks the streaming reader against the BeautifulSoup path in documents/sec
+# and checks that both produce identical (newid, text) records
+def compare_parsers(directory):
+    print("="*70)
+    print("PARSING COMPARISON: STREAMING READER VS BEAUTIFULSOUP")
+    print("="*70)
+    sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
+
+    soup_start = time.perf_counter()
+    soup_docs = [doc for filepath in sgm_files for doc in parse_sgm_soup(filepath)]
+    soup_time = time.perf_counter() - soup_start
+
+    stream_start = time.perf_counter()
+    stream_docs = [doc for filepath in sgm_files for doc in iter_sgm(filepath)]
+    stream_time = time.perf_counter() - stream_start
+
+    mismatches = sum(1 for a, b in zip(soup_docs, stream_docs) if a != b)
+    mismatches += abs(len(soup_docs) - len(stream_docs))
+    print(f"DEBUG: BeautifulSoup parsed {len(soup_docs)} documents in {soup_time:.2f} seconds "
+          f"({len(soup_docs)/soup_time:,.0f} docs/sec)")
+    print(f"DEBUG: streaming reader parsed {len(stream_docs)} documents in {stream_time:.2f} seconds "
+          f"({len(stream_docs)/stream_time:,.0f} docs/sec)")
+    print(f"DEBUG: speedup is {soup_time/stream_time:.1f}x, {mismatches} mismatching records")
+    return mismatches == 0
+
+# Testing
+if __name__ == "__main__":
+    reuters_dir = 'C:\\Users\\prowl\\Downloads\\reuters21578'
+    compare_parsers(reuters_dir)
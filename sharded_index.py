@@ -0,0 +1,155 @@
+import os, sys, glob, time, heapq
+from array import array
+from multiprocessing import Pool, Process, Pipe
+
+from naive_indexer import parse_sgm
+from parallel_indexer import index_batch, merge_partials
+from index_store import write_index, open_index
+from query_processor import lookup_singleQ, lookup_andQ
+
+# Queries a coordinator keeps in flight per shard when running a batch
+PIPELINE_WINDOW = 32
+
+
+# Splits the .sgm files of a directory round-robin into num_shards disjoint sets
+def partition_files(directory, num_shards):
+    sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
+    return [sgm_files[shard::num_shards] for shard in range(num_shards)]
+
+# Builds one document-partitioned shard with the parallel indexer's batch builder and writes it with index_store
+def build_shard(args):
+    files, path = args
+    partials = [index_batch(list(parse_sgm(filepath)))[0] for filepath in files]
+    write_index(merge_partials(partials), path)
+    return path
+
+# Builds num_shards shards in parallel, one process per shard, returns the shard index files
+def build_shards(directory, num_shards, shard_dir='shards'):
+    os.makedirs(shard_dir, exist_ok=True)
+    jobs = [(files, os.path.join(shard_dir, f'shard_{shard}_of_{num_shards}.bin'))
+            for shard, files in enumerate(partition_files(directory, num_shards))]
+    start_time = time.perf_counter()
+    with Pool(processes=num_shards) as pool:
+        paths = pool.map(build_shard, jobs)
+    print(f"DEBUG: built {num_shards} shards in {time.perf_counter() - start_time:.2f} seconds")
+    return paths
+
+
+def _encode(docids):
+    encoded = array('I', docids)
+    if sys.byteorder == 'big':
+        encoded.byteswap()
+    return encoded.tobytes()
+
+def _decode(data):
+    decoded = array('I')
+    decoded.frombytes(data)
+    if sys.byteorder == 'big':
+        decoded.byteswap()
+    return decoded.tolist()
+
+# Runs inside a shard process: answers (terms) requests on conn until it receives None
+# A single term is a lookup_singleQ, several terms a lookup_andQ; results go back as raw uint32 docIDs
+def shard_worker(conn, path):
+    index = open_index(path)
+    while True:
+        terms = conn.recv()
+        if terms is None:
+            break
+        if len(terms) == 1:
+            result, _ = lookup_singleQ(index, terms[0])
+        else:
+            result, _ = lookup_andQ(index, *terms)
+        conn.send_bytes(_encode(result))
+    index.close()
+    conn.close()
+
+
+# Coordinator over document-partitioned shards, one worker process per shard connected by a Pipe
+# Every document lives in exactly one shard, so a query is answered by sending it to every shard
+# (scatter) and merging their docID-sorted answers (gather) - AND queries included
+class ShardedIndex:
+    def __init__(self, paths):
+        self.connections = []
+        self.workers = []
+        for path in paths:
+            parent_conn, child_conn = Pipe()
+            worker = Process(target=shard_worker, args=(child_conn, path), daemon=True)
+            worker.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.workers.append(worker)
+
+    def _scatter(self, terms):
+        for conn in self.connections:
+            conn.send(terms)
+
+    def _gather(self):
+        return list(heapq.merge(*(_decode(conn.recv_bytes()) for conn in self.connections)))
+
+    # Same interface as query_processor.lookup_singleQ
+    def lookup_singleQ(self, term):
+        start_time = time.perf_counter()
+        self._scatter((term,))
+        return self._gather(), time.perf_counter() - start_time
+
+    # Same interface as query_processor.lookup_andQ
+    def lookup_andQ(self, *terms):
+        if not terms:
+            return [], 0.0
+        start_time = time.perf_counter()
+        self._scatter(terms)
+        return self._gather(), time.perf_counter() - start_time
+
+    # Runs a batch of queries (sequences of terms) keeping up to "window" queries in flight on every shard,
+    # so all shards work at the same time. Returns the results in query order
+    def run_queries(self, queries, window=PIPELINE_WINDOW):
+        results = []
+        for i, query in enumerate(queries):
+            self._scatter(tuple(query))
+            if i >= window:
+                results.append(self._gather())
+        while len(results) < len(queries):
+            results.append(self._gather())
+        return results
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(None)
+            conn.close()
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Measures query throughput for every shard count and checks the answers against the unsharded index
+def compare_shard_scaling(directory, queries, shard_counts=(1, 2, 4), shard_dir='shards'):
+    print("="*70)
+    print("DOCUMENT-PARTITIONED SHARDS: QUERY THROUGHPUT")
+    print("="*70)
+    reference = None
+    for num_shards in shard_counts:
+        paths = build_shards(directory, num_shards, shard_dir)
+        with ShardedIndex(paths) as sharded:
+            sharded.run_queries(queries[:PIPELINE_WINDOW])  # warmup
+            start_time = time.perf_counter()
+            results = sharded.run_queries(queries)
+            elapsed_time = time.perf_counter() - start_time
+        if reference is None:
+            reference = results
+        elif results != reference:
+            raise AssertionError(f"{num_shards} shards disagree with a single shard")
+        print(f"DEBUG: {num_shards} shards answered {len(queries):,} queries in {elapsed_time:.2f} seconds "
+              f"({len(queries) / elapsed_time:,.0f} queries/sec)")
+
+# Testing
+if __name__ == "__main__":
+    from naive_indexer import REUTERS_DIR
+    test_queries = [["lawsuit"], ["bankruptcy"], ["hollywood"], ["liberal", "conservative"],
+                    ["supreme", "court"], ["cold", "war"], ["copper"], ["Chrysler"], ["Bundesbank"]] * 200
+    compare_shard_scaling(REUTERS_DIR, test_queries, (1, 2, 4, os.cpu_count()))
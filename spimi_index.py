@@ -1,140 +1,228 @@
-#pip install nltk
-#pip install lxml
-
-import nltk, os, glob, time
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import RegexpTokenizer
+import os, glob, time, heapq, struct, tempfile
 from collections import defaultdict
 
 # Reused from other modules
 from naive_indexer import parse_sgm
-from naive_indexer import preprocess_tokenize
-
-nltk.download('punkt', quiet=True)
-nltk.download('punkt_tab', quiet=True)
-nltk.download('stopwords', quiet=True)
-
-TOKENIZER = RegexpTokenizer(r"[A-Za-z0-9]+(?:'[\w]+)?")
-STOPWORDS = set(stopwords.words('english'))
-STEMMER = PorterStemmer()
+from naive_indexer import preprocess_tokenize, preprocess_tokens
+from parallel_indexer import build_parallel_index
+from index_store import IndexWriter
+from ranked_retrieval import RankedIndex
+from postings_codec import encode_postings, from_gaps, vbyte_append, vbyte_read, vbyte_decode, vbyte_encode
 
 # Memory limit for each block (measured in number of postings)
 BLOCK_SIZE_LIMIT = 50000
+# Size of the read buffer of each block file during the k-way merge (in bytes)
+READ_BUFFER_SIZE = 1 << 16
 
+RECORD_LENGTH = struct.Struct('<I')
+
+
+# Streams the (term, docID) pairs of every document in the corpus, in docID order
+# stats["docs"] counts the documents consumed so far, stats["doc_lengths"] records their lengths
+# token_cache: reads the tokenized documents from a token_cache.TokenCache instead of parsing the SGML
+def token_stream(directory, stats=None, token_cache=None):
+    sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
+    for filepath in sgm_files:
+        if token_cache is not None:
+            documents = ((docid, preprocess_tokens(tokens)) for docid, tokens in token_cache.iter_file(filepath))
+        else:
+            documents = ((docid, preprocess_tokenize(text)) for docid, text in parse_sgm(filepath))
+        for docid, terms in documents:
+            if stats is not None:
+                stats['docs'] = stats.get('docs', 0) + 1
+                stats.setdefault('doc_lengths', {})[docid] = len(terms)
+            for term in terms:
+                yield term, docid
 
 # Implements SPIMI algorithm by building an in-memory inverted index from a stream of term-docID pairs, 
 # until the block size limit is reached.
-def spimi_invert(token_stream, block_num):    
-    # A hash table mapping each term -> list of docIDs
+def spimi_invert(token_stream, block_num, block_dir='.', block_size=BLOCK_SIZE_LIMIT):
+    # A hash table mapping each term -> list of docIDs, and the matching term frequencies
     dictionary = defaultdict(list)
+    frequencies = defaultdict(list)
     postings_count = 0
 
     print(f"DEBUG: building block {block_num}...")
     for term, docid in token_stream:
-        if not dictionary[term] or dictionary[term][-1] != docid:
-            dictionary[term].append(docid)
-            postings_count += 1
-        if postings_count >= BLOCK_SIZE_LIMIT:
+        postings = dictionary[term]
+        if postings and postings[-1] == docid:
+            frequencies[term][-1] += 1
+            continue
+        postings.append(docid)
+        frequencies[term].append(1)
+        postings_count += 1
+        if postings_count >= block_size:
             break
 
     sorted_terms = sorted(dictionary.keys())
-    block_filename = f'spimi_block_{block_num}.txt'
-    write_to_disk(sorted_terms, dictionary, block_filename)
+    block_filename = os.path.join(block_dir, f'spimi_block_{block_num}.bin')
+    write_to_disk(sorted_terms, dictionary, block_filename, frequencies)
     print(f"DEBUG: block {block_num} written with {len(dictionary)} terms and {postings_count} postings.")
     return block_filename, postings_count
 
-# Writes the block to disk in human-readable format, one term per line.
-def write_to_disk(sorted_terms, dictionary, filename):
-    with open(filename, 'w', encoding='utf-8') as f:
+# Writes the block to disk in a compact binary format, one record per term:
+# record length (uint32), then variable byte codes of the term length, the term (UTF-8),
+# the document frequency, the docID gaps and the term frequencies
+# Postings are normally appended in docID order; a term whose docIDs arrived out of order is sorted here
+# (term frequencies of a repeated docID are summed) so that every docID gap is positive
+def write_to_disk(sorted_terms, dictionary, filename, frequencies):
+    with open(filename, 'wb') as f:
         for term in sorted_terms:
             postings = dictionary[term]
-            f.write(f"{term}: {' '.join(map(str, postings))}\n")
+            tfs = frequencies[term]
+            if any(previous >= docid for previous, docid in zip(postings, postings[1:])):
+                counts = {}
+                for docid, tf in zip(postings, tfs):
+                    counts[docid] = counts.get(docid, 0) + tf
+                postings = sorted(counts)
+                tfs = [counts[docid] for docid in postings]
+            encoded_term = term.encode('utf-8')
+            record = bytearray()
+            vbyte_append(len(encoded_term), record)
+            record += encoded_term
+            vbyte_append(len(postings), record)
+            record += encode_postings(postings)
+            record += vbyte_encode(tfs)
+            f.write(RECORD_LENGTH.pack(len(record)))
+            f.write(record)
+
+# Streams the (term, postings, tfs) records of a block file through a read buffer of buffer_size bytes
+def read_block(filename, buffer_size=READ_BUFFER_SIZE):
+    with open(filename, 'rb', buffering=buffer_size) as f:
+        while True:
+            header = f.read(RECORD_LENGTH.size)
+            if not header:
+                return
+            record = f.read(RECORD_LENGTH.unpack(header)[0])
+            term_length, pos = vbyte_read(record, 0)
+            term = record[pos:pos + term_length].decode('utf-8')
+            df, pos = vbyte_read(record, pos + term_length)
+            gaps, pos = vbyte_decode(record, pos, df)
+            tfs, _ = vbyte_decode(record, pos, df)
+            yield term, from_gaps(gaps), tfs
 
 
 # Combines multiple sorted block files into a single inverted index by executing the k-way merge 
-# algorithm, also removes duplicates. 
-def merge_blocks(block_files, output_file='spimi_inverted_index.txt'):
+# algorithm, also removes duplicates.
+# A heap holds the current record of each block, so only one record per block is ever in memory, and
+# each merged postings list is streamed to the final index file (index_store format) as soon as it is complete.
+# Term frequencies are summed for a document split across blocks, and written along with doc_lengths.
+def merge_blocks(block_files, output_file='spimi_inverted_index.bin', buffer_size=READ_BUFFER_SIZE,
+                 doc_lengths=None):
     print(f"\nDEBUG: merging {len(block_files)} blocks...")
 
-    file_handles = []
-    block_lines = []
+    readers = [read_block(block_file, buffer_size) for block_file in block_files]
+    heap = []
+    for block_idx, reader in enumerate(readers):
+        record = next(reader, None)
+        if record:
+            heap.append((record[0], block_idx, record[1], record[2]))
+    heapq.heapify(heap)
+
+    num_terms = 0
+    num_postings = 0
+    # The BM25 max score of every term is stored with it, so ranked retrieval never has to compute it
+    # (see ranked_retrieval.RankedIndex.from_disk); it needs the document lengths, known before the merge
+    scorer = RankedIndex(None, doc_lengths) if doc_lengths is not None else None
+    max_scores = (scorer.k1, scorer.b) if scorer is not None else None
+    with IndexWriter(output_file, with_tf=True, max_scores=max_scores) as writer:
+        while heap:
+            min_term = heap[0][0]
+            # Collects the postings for this term from all blocks, in block (hence docID) order
+            merged, merged_tfs = [], []
+            while heap and heap[0][0] == min_term:
+                _, block_idx, postings, tfs = heapq.heappop(heap)
+                if merged and merged[-1] >= postings[0]:
+                    # A document split across two blocks, or blocks out of docID order
+                    counts = dict(zip(merged, merged_tfs))
+                    for docid, tf in zip(postings, tfs):
+                        counts[docid] = counts.get(docid, 0) + tf
+                    merged = sorted(counts)
+                    merged_tfs = [counts[docid] for docid in merged]
+                else:
+                    merged.extend(postings)
+                    merged_tfs.extend(tfs)
+                record = next(readers[block_idx], None)
+                if record:
+                    heapq.heappush(heap, (record[0], block_idx, record[1], record[2]))
+            writer.add(min_term, merged, merged_tfs,
+                       scorer.max_score(merged, merged_tfs) if scorer is not None else None)
+            num_terms += 1
+            num_postings += len(merged)
+        if doc_lengths is not None:
+            writer.set_document_lengths(doc_lengths)
 
-    for block_file in block_files:
-        fh = open(block_file, 'r', encoding='utf-8')
-        file_handles.append(fh)
-        line = fh.readline()
-        if line:
-            term, postings_str = line.strip().split(':', 1)
-            postings = list(map(int, postings_str.split()))
-            block_lines.append((term, postings, len(file_handles)-1))
-
-    merged_index = defaultdict(list)
-    while block_lines:
-        # Find the minimum term
-        block_lines.sort(key=lambda x: x[0])
-        min_term = block_lines[0][0]
-
-        # Collect all postings for this term from all blocks
-        postings_for_term = []
-        indices_to_remove = []
-        for i, (term, postings, file_idx) in enumerate(block_lines):
-            if term == min_term:
-                postings_for_term.extend(postings)
-                indices_to_remove.append(i)
-        # Remove processed entries and read next lines
-        for i in reversed(indices_to_remove):
-            file_idx = block_lines[i][2]
-            block_lines.pop(i)
-
-            # Read next line from this file
-            line = file_handles[file_idx].readline()
-            if line:
-                term, postings_str = line.strip().split(':', 1)
-                postings = list(map(int, postings_str.split()))
-                block_lines.append((term, postings, file_idx))
-        
-        # Merge and sort postings + remove duplicates
-        merged_index[min_term] = sorted(set(postings_for_term))
-    
-    # Closes all file handles for maintenance
-    for fh in file_handles:
-        fh.close()
-
-    # Writes the merged inverted index to disk in human-readable format
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for term in sorted(merged_index.keys()):
-            postings = merged_index[term]
-            f.write(f"{term}: {' '.join(map(str, postings))}\n")
-    
     # Cleans up the block files
     for block_file in block_files:
         if os.path.exists(block_file):
             os.remove(block_file)
-    return merged_index
+    print(f"DEBUG: merged index with {num_terms} terms and {num_postings} postings written to {output_file}")
+    return output_file
+
+# Disk-based SPIMI (Figure 4.4): inverts the token stream block by block, then merges the blocks
+# Peak memory is bounded by block_size, not by the size of the corpus
+def build_spimi_disk(directory, output_file='spimi_inverted_index.bin', block_size=BLOCK_SIZE_LIMIT,
+                     buffer_size=READ_BUFFER_SIZE, block_dir=None, token_cache=None):
+    print("DEBUG: building disk-based SPIMI index.")
+    start_time = time.time()
+    stats = {}
+    stream = token_stream(directory, stats, token_cache)
+    block_files = []
+    with tempfile.TemporaryDirectory(dir=block_dir) as tmp_dir:
+        while True:
+            block_file, postings_count = spimi_invert(stream, len(block_files) + 1, tmp_dir, block_size)
+            if postings_count:
+                block_files.append(block_file)
+            else:
+                os.remove(block_file)
+            if postings_count < block_size:
+                break
+        merge_blocks(block_files, output_file, buffer_size, stats.get('doc_lengths', {}))
+    elapsed_time = time.time() - start_time
+    print(f"DEBUG: {stats.get('docs', 0)} documents indexed in {elapsed_time:.2f} seconds")
+    return output_file, elapsed_time, stats.get('docs', 0)
 
 
 # Builds inverted index by appending docIds to postings lists using a hash table.
 # Showcases SPIMI's O(1) insertion with no O(T log T) sorting as with the naive indexer.
-def build_spimi_inspired(directory):
+# With workers > 1 the documents are spread over a process pool (see parallel_indexer.py).
+# The text dump is an optional export, written only when output_file is given.
+# record_tf: postings hold (docID, tf) pairs instead of bare docIDs, for ranked retrieval
+# dedup: a near_duplicates.NearDuplicateDetector (serial build only, documents must be seen in docID order)
+def build_spimi_inspired(directory, workers=1, output_file=None, record_tf=False, dedup=None):
     print("DEBUG: building SPIMI-inspired index.")
     total_docs = 0
     total_postings = 0
     inverted_index = defaultdict(list)
     
     start_time = time.time()
-    sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
-    for filepath in sgm_files:
-        documents = parse_sgm(filepath)
-        for docid, text in documents:
-            total_docs += 1
-            terms = preprocess_tokenize(text)
-            # where the SPIMI innovation kicks in
-            # O(1) insertion per term, no sorting necessary
-            for term in terms:
-                if not inverted_index[term] or inverted_index[term][-1] != docid:
-                    inverted_index[term].append(docid)
-                    total_postings += 1
+    if workers > 1 and dedup is not None:
+        raise ValueError("the dedup stage is only available for the serial build (workers=1)")
+    if workers > 1:
+        inverted_index, _, total_docs = build_parallel_index(directory, workers, record_tf=record_tf)
+        total_postings = sum(len(postings) for postings in inverted_index.values())
+    else:
+        sgm_files = sorted(glob.glob(os.path.join(directory, '*.sgm')))
+        for filepath in sgm_files:
+            documents = parse_sgm(filepath)
+            for docid, text in documents:
+                terms = preprocess_tokenize(text)
+                if dedup is not None and dedup.check(docid, terms) is not None and dedup.mode == 'collapse':
+                    continue
+                total_docs += 1
+                # where the SPIMI innovation kicks in
+                # O(1) insertion per term, no sorting necessary
+                for term in terms:
+                    postings = inverted_index[term]
+                    if record_tf:
+                        if postings and postings[-1][0] == docid:
+                            postings[-1] = (docid, postings[-1][1] + 1)
+                        else:
+                            postings.append((docid, 1))
+                            total_postings += 1
+                    elif not postings or postings[-1] != docid:
+                        postings.append(docid)
+                        total_postings += 1
     end_time = time.time()
     elapsed_time = end_time - start_time
 
@@ -145,14 +233,16 @@ def build_spimi_inspired(directory):
     print(f"DEBUG: total postings is {total_postings}")
     print(f"DEBUG: process took {elapsed_time:.2f} seconds")
     print(f"DEBUG: average time per document is {elapsed_time/total_docs:.4f} seconds")
+    if dedup is not None:
+        dedup.print_report()
 
     # Writes SPIMI inverted index to file for inspection
-    output_file = 'spimi_inverted_index.txt'
-    print(f"\nDEBUG: writing inverted index to {output_file}...")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for term in sorted(inverted_index.keys()):
-            postings = inverted_index[term]
-            f.write(f"{term}: {' '.join(map(str, postings))}\n")
+    if output_file:
+        print(f"\nDEBUG: writing inverted index to {output_file}...")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for term in sorted(inverted_index.keys()):
+                postings = inverted_index[term]
+                f.write(f"{term}: {' '.join(map(str, postings))}\n")
     return inverted_index, elapsed_time, total_docs
 
 
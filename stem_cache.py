@@ -0,0 +1,77 @@
+#pip install nltk  (PorterStemmer, imported on the first cache miss)
+
+from collections import OrderedDict
+
+# Default bound on the number of cached stems
+# Comfortably above the Reuters vocabulary, so a full build never evicts
+STEM_CACHE_SIZE = 200000
+
+
+# Memoizes PorterStemmer.stem with a bounded size and least-recently-used eviction
+# Term frequencies are Zipfian, so most calls are hits and stemming cost scales with vocabulary size
+class StemCache:
+    def __init__(self, maxsize=STEM_CACHE_SIZE, stemmer=None):
+        # maxsize=None disables eviction altogether
+        self.maxsize = maxsize
+        # Created on the first cache miss: importing nltk takes longer than everything else at startup
+        self.stemmer = stemmer
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the stem of token, computing it only on a cache miss
+    def stem(self, token):
+        cache = self.cache
+        stemmed = cache.get(token)
+        if stemmed is not None:
+            self.hits += 1
+            cache.move_to_end(token)
+            return stemmed
+        self.misses += 1
+        if self.stemmer is None:
+            from nltk.stem import PorterStemmer
+            self.stemmer = PorterStemmer()
+        stemmed = self.stemmer.stem(token)
+        cache[token] = stemmed
+        if self.maxsize is not None and len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+        return stemmed
+
+    # Changes the size bound, evicting the least recently used stems if needed
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        while maxsize is not None and len(self.cache) > maxsize:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    # Reports hits, misses, evictions and the hit rate since the last clear()
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.cache),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Shared by the stem stage of every analyzer (analyzer.stem), each analyzer memoizes whole chains per raw
+# token and reaches it once per distinct token; the hit rate worth watching is the analyzer's (analyzer.print_stats)
+STEM_CACHE = StemCache()
+
+def stem(token):
+    return STEM_CACHE.stem(token)
+
+def print_stats(cache=STEM_CACHE):
+    stats = cache.stats()
+    print(f"DEBUG: stem cache holds {stats['size']:,} stems (bound {stats['maxsize']}), "
+          f"{stats['hits']:,} hits, {stats['misses']:,} misses, {stats['evictions']:,} evictions, "
+          f"hit rate {stats['hit_rate']:.1%}")
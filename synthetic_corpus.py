@@ -0,0 +1,92 @@
+import os, sys, math, random, time
+from itertools import accumulate
+
+# Shape of the Reuters-21578 collection
+REUTERS_DOCS = 21578
+DOCS_PER_FILE = 1000
+MEAN_DOC_LENGTH = 130
+# Zipf exponent of the term distribution (collection frequency of the i-th term ~ 1/i^s)
+ZIPF_EXPONENT = 1.0
+# Heaps' law M = k T^b (Section 5.1.1), sizes the vocabulary from the number of tokens
+HEAPS_K = 44
+HEAPS_B = 0.49
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+TOPICS = ('earn', 'acq', 'money-fx', 'grain', 'crude', 'trade', 'interest', 'ship', 'wheat', 'corn')
+PLACES = ('NEW YORK', 'LONDON', 'TOKYO', 'WASHINGTON', 'FRANKFURT', 'CHICAGO', 'PARIS', 'TORONTO')
+MONTHS = ('JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC')
+
+
+# Distinct pseudo-words, shortest for the most frequent ranks as in natural language
+def make_vocabulary(size, rng):
+    vocabulary = []
+    seen = set()
+    while len(vocabulary) < size:
+        rank = len(vocabulary) + 1
+        length = rng.randint(3, 5) + min(7, int(math.log10(rank)) * 2)
+        word = ''.join(rng.choice(LETTERS) for _ in range(length))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+# Yields num_docs (docID, title, body) triples whose words follow a Zipf distribution over the vocabulary
+def generate_documents(num_docs, vocab_size=None, mean_length=MEAN_DOC_LENGTH, zipf_exponent=ZIPF_EXPONENT,
+                       seed=479):
+    rng = random.Random(seed)
+    if vocab_size is None:
+        vocab_size = int(HEAPS_K * (num_docs * mean_length) ** HEAPS_B)
+    vocabulary = make_vocabulary(vocab_size, rng)
+    cum_weights = list(accumulate(1.0 / rank ** zipf_exponent for rank in range(1, vocab_size + 1)))
+    for docid in range(1, num_docs + 1):
+        length = max(5, int(rng.expovariate(1.0 / mean_length)))
+        title = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(3, 8))
+        body = rng.choices(vocabulary, cum_weights=cum_weights, k=length)
+        yield docid, ' '.join(title).upper(), ' '.join(body)
+
+# Formats one document exactly like the Reuters-21578 SGML records
+def format_document(docid, title, body, rng):
+    day, month = rng.randint(1, 28), rng.choice(MONTHS)
+    lines = [
+        f'<REUTERS TOPICS="YES" LEWISSPLIT="TRAIN" CGISPLIT="TRAINING-SET" OLDID="{docid + 5000}" NEWID="{docid}">',
+        f'<DATE>{day:02d}-{month}-1987 {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00.00</DATE>',
+        f'<TOPICS><D>{rng.choice(TOPICS)}</D></TOPICS>',
+        '<TEXT>&#2;',
+        f'<TITLE>{title}</TITLE>',
+        f'<DATELINE>    {rng.choice(PLACES)}, {month.capitalize()} {day} - </DATELINE><BODY>{body}',
+        ' Reuter',
+        '&#3;</BODY></TEXT>',
+        '</REUTERS>',
+    ]
+    return '\n'.join(lines) + '\n'
+
+# Writes a Reuters-format corpus of num_docs documents to directory, DOCS_PER_FILE documents per reut2-NNN.sgm
+# File numbers are zero-padded to the width of the file count, so sorted(glob) (which every builder uses)
+# returns the files, hence the docIDs, in increasing order at any scale
+# Returns (list of files written, total bytes)
+def generate_corpus(directory, num_docs=REUTERS_DOCS, docs_per_file=DOCS_PER_FILE, seed=479, **params):
+    os.makedirs(directory, exist_ok=True)
+    width = max(3, len(str(-(-num_docs // docs_per_file) - 1)))
+    rng = random.Random(seed + 1)
+    files = []
+    total_bytes = 0
+    out = None
+    for docid, title, body in generate_documents(num_docs, seed=seed, **params):
+        if (docid - 1) % docs_per_file == 0:
+            if out:
+                out.close()
+            filepath = os.path.join(directory, f'reut2-{len(files):0{width}d}.sgm')
+            files.append(filepath)
+            out = open(filepath, 'w', encoding='latin-1')
+            total_bytes += out.write('<!DOCTYPE lewis SYSTEM "lewis.dtd">\n')
+        total_bytes += out.write(format_document(docid, title, body, rng))
+    if out:
+        out.close()
+    print(f"DEBUG: wrote {num_docs:,} synthetic documents ({total_bytes:,} bytes) in {len(files)} files to {directory}")
+    return files, total_bytes
+
+# Testing: python synthetic_corpus.py <directory> [number of documents]
+if __name__ == "__main__":
+    start_time = time.perf_counter()
+    generate_corpus(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else REUTERS_DOCS)
+    print(f"DEBUG: generation took {time.perf_counter() - start_time:.2f} seconds")
@@ -0,0 +1,175 @@
+import os, sys, glob, json, struct, hashlib, time
+from array import array
+from naive_indexer import parse_sgm
+from analyzer import TOKENIZER
+
+# Location of the persistent cache of the tokenized corpus
+TOKEN_CACHE_DIR = os.environ.get('TOKEN_CACHE_DIR', '.token_cache')
+MANIFEST_FILE = 'manifest.json'
+
+# Cache file layout (little-endian), one file per .sgm file:
+#   header      magic, version, typecode of the token ids ('H' or 'I'), number of documents, vocabulary size,
+#               length of the vocabulary blob
+#   vocabulary  the distinct tokens of the .sgm file, utf-8, newline separated (tokens never contain one)
+#   documents   docIDs (u32), token counts (u32)
+#   tokens      token ids into the vocabulary, in document order
+CACHE_MAGIC = b'IRTC'
+CACHE_VERSION = 1
+HEADER = struct.Struct('<4sHcxIIQ')
+
+
+def _file_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+# Raw tokens of every document of one .sgm file, exactly as TOKENIZER returns them (case preserved),
+# so every builder can still apply its own case folding, stopword removal and stemming
+def tokenize_file(filepath):
+    for docid, text in parse_sgm(filepath):
+        yield docid, TOKENIZER.tokenize(text)
+
+def write_cache_file(records, path):
+    vocabulary = {}
+    docids = array('I')
+    counts = array('I')
+    ids = []
+    for docid, tokens in records:
+        docids.append(docid)
+        counts.append(len(tokens))
+        ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+    typecode = 'H' if len(vocabulary) <= 1 << 16 else 'I'
+    blob = '\n'.join(vocabulary).encode('utf-8')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(CACHE_MAGIC, CACHE_VERSION, typecode.encode(), len(docids), len(vocabulary), len(blob)))
+        f.write(blob)
+        f.write(_little_endian(docids).tobytes())
+        f.write(_little_endian(counts).tobytes())
+        f.write(_little_endian(array(typecode, ids)).tobytes())
+    os.replace(tmp_path, path)
+
+# Streams the (docID, tokens) records of a cache file
+def read_cache_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, typecode, num_docs, vocab_size, blob_length = HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        raise ValueError(f"{path} is not a token cache file of version {CACHE_VERSION}")
+    pos = HEADER.size
+    vocabulary = data[pos:pos + blob_length].decode('utf-8').split('\n') if vocab_size else []
+    pos += blob_length
+    docids = array('I')
+    docids.frombytes(data[pos:pos + 4 * num_docs])
+    pos += 4 * num_docs
+    counts = array('I')
+    counts.frombytes(data[pos:pos + 4 * num_docs])
+    pos += 4 * num_docs
+    ids = array(typecode.decode())
+    ids.frombytes(data[pos:])
+    for values in (docids, counts, ids):
+        _little_endian(values)
+    start = 0
+    for docid, count in zip(docids, counts):
+        yield docid, [vocabulary[i] for i in ids[start:start + count]]
+        start += count
+
+
+# Persistent cache of the parsed and tokenized corpus, one cache file per .sgm file
+# A .sgm file is only re-parsed when its content changes: unchanged size and mtime are trusted,
+# otherwise the content hash decides (eg: a file that was touched or copied keeps its cache)
+class TokenCache:
+    def __init__(self, cache_dir=TOKEN_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.hits = 0
+        self.rebuilt = 0
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.tok')
+
+    # Returns the path of the up-to-date cache file of an .sgm file, tokenizing it only if it changed
+    def refresh(self, filepath):
+        key = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        entry = self.manifest.get(key)
+        cache_path = self._cache_path(key)
+        if entry and os.path.exists(cache_path):
+            if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                self.hits += 1
+                return cache_path
+            content_hash = _file_hash(filepath)
+            if entry['sha256'] == content_hash:
+                entry['mtime_ns'] = stat.st_mtime_ns
+                self._save_manifest()
+                self.hits += 1
+                return cache_path
+        else:
+            content_hash = _file_hash(filepath)
+        write_cache_file(tokenize_file(filepath), cache_path)
+        self.manifest[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': content_hash}
+        self._save_manifest()
+        self.rebuilt += 1
+        return cache_path
+
+    # Streams the (docID, tokens) records of one .sgm file
+    def iter_file(self, filepath):
+        return read_cache_file(self.refresh(filepath))
+
+    # Streams the (docID, tokens) records of every .sgm file of a directory, in file order
+    def iter_documents(self, directory):
+        for filepath in sorted(glob.glob(os.path.join(directory, '*.sgm'))):
+            yield from self.iter_file(filepath)
+
+    # Drops the cache files of .sgm files that no longer exist
+    def prune(self):
+        for key in [key for key in self.manifest if not os.path.exists(key)]:
+            cache_path = self._cache_path(key)
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            del self.manifest[key]
+        self._save_manifest()
+
+    def print_stats(self):
+        print(f"DEBUG: token cache in {self.cache_dir}: {self.hits} files reused, {self.rebuilt} files re-tokenized")
+
+
+# Records of one .sgm file, from the cache when one is given, otherwise parsed and tokenized on the fly
+def iter_tokenized(filepath, token_cache=None):
+    if token_cache is not None:
+        return token_cache.iter_file(filepath)
+    return tokenize_file(filepath)
+
+# Testing: compares reading the cache with parsing and tokenizing the raw SGML
+if __name__ == "__main__":
+    from naive_indexer import REUTERS_DIR
+    cache = TokenCache()
+    for label in ("first run", "second run"):
+        start_time = time.perf_counter()
+        num_tokens = sum(len(tokens) for _, tokens in cache.iter_documents(REUTERS_DIR))
+        print(f"DEBUG: {label} read {num_tokens:,} tokens in {time.perf_counter() - start_time:.2f} seconds")
+        cache.print_stats()
+    start_time = time.perf_counter()
+    sgm_files = sorted(glob.glob(os.path.join(REUTERS_DIR, '*.sgm')))
+    num_tokens = sum(len(tokens) for filepath in sgm_files for _, tokens in tokenize_file(filepath))
+    print(f"DEBUG: parsing and tokenizing the SGML read {num_tokens:,} tokens in "
+          f"{time.perf_counter() - start_time:.2f} seconds")